@@ -7,16 +7,46 @@ and financial documents with AI-powered extraction and fraud detection.
 """
 
 import click
+import os
 import sys
 import logging
 from pathlib import Path
+from typing import Iterator, List, Tuple
 
-from services.processor import PayslipProcessor
 from services.config import Config
 
 logger = logging.getLogger(__name__)
 
 
+def _iter_files(folder: Path) -> Iterator[os.DirEntry]:
+    """Yield non-hidden files under folder without materializing a list.
+    
+    Uses os.scandir so file types come from the directory entries rather
+    than a stat() per path.
+    """
+    stack = [str(folder)]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_file(follow_symlinks=False):
+                    yield entry
+                elif entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+
+
+def _count_files(folder: Path, sample_size: int = 0) -> Tuple[int, List[str]]:
+    """Count files under folder in one pass, keeping the first few names."""
+    count = 0
+    sample: List[str] = []
+    for entry in _iter_files(folder):
+        count += 1
+        if count <= sample_size:
+            sample.append(entry.name)
+    return count, sample
+
+
 @click.group()
 @click.version_option(version="1.0.0")
 def cli():
@@ -54,15 +84,17 @@ def ingest(config: str, output: str, verbose: bool):
         
         click.echo("🚀 Starting document ingestion...")
         
-        # Initialize processor
+        # Initialize processor (imported here so other commands skip the heavy imports)
+        from services.processor import PayslipProcessor
         processor = PayslipProcessor(config)
+        if processor.config.ai.mode.lower() == "batch":
+            click.echo(
+                "📦 Batch mode: submitting to the provider batch API, "
+                "results may take a while..."
+            )
         
-        # Run processing pipeline
-        batch_result = processor.run()
-        
-        # Save to specified output directory
-        if batch_result.documents:
-            processor.save_results(batch_result, output)
+        # Run processing pipeline, saving to the specified output directory
+        batch_result = processor.run(output)
         
         # Exit with appropriate code
         if batch_result.failed_extractions > 0:
@@ -78,8 +110,7 @@ def ingest(config: str, output: str, verbose: bool):
     except Exception as e:
         click.echo(f"❌ Processing failed: {e}", err=True)
         if verbose:
-            import traceback
-            traceback.print_exc()
+            logger.exception("Ingest failed")
         sys.exit(1)
 
 
@@ -160,31 +191,30 @@ def status(config: str):
         # Configuration info
         click.echo(f"Config file: {config}")
         click.echo(f"AI Provider: {cfg.ai.provider} ({cfg.ai.model})")
+        click.echo(f"AI Mode: {cfg.ai.mode}")
         click.echo(f"Docs folder: {cfg.processing.docs_folder}")
         click.echo(f"Archive folder: {cfg.processing.archive_folder}")
         
         # Check for pending documents
         docs_path = Path(cfg.processing.docs_folder)
         if docs_path.exists():
-            pending_files = list(docs_path.rglob("*"))
-            pending_files = [f for f in pending_files if f.is_file() and not f.name.startswith('.')]
-            click.echo(f"Pending documents: {len(pending_files)}")
+            pending_count, pending_sample = _count_files(docs_path, sample_size=10)
+            click.echo(f"Pending documents: {pending_count}")
             
-            if pending_files:
+            if pending_count:
                 click.echo("\nPending files:")
-                for file_path in pending_files[:10]:  # Show first 10
-                    click.echo(f"  • {file_path.name}")
-                if len(pending_files) > 10:
-                    click.echo(f"  ... and {len(pending_files) - 10} more")
+                for file_name in pending_sample:  # Show first 10
+                    click.echo(f"  • {file_name}")
+                if pending_count > 10:
+                    click.echo(f"  ... and {pending_count - 10} more")
         else:
             click.echo("Pending documents: 0 (folder not found)")
         
         # Check archive
         archive_path = Path(cfg.processing.archive_folder)
         if archive_path.exists():
-            archive_files = list(archive_path.rglob("*"))
-            archive_files = [f for f in archive_files if f.is_file()]
-            click.echo(f"Archived documents: {len(archive_files)}")
+            archive_count, _ = _count_files(archive_path)
+            click.echo(f"Archived documents: {archive_count}")
         else:
             click.echo("Archived documents: 0 (folder not found)")
         
@@ -247,17 +277,28 @@ def setup():
 provider = "{provider}"
 model = "{model}"
 api_key_file = "{api_key_file}"
+max_concurrency = 4
+max_retries = 5
+mode = "sync"
+image_max_edge = 1600
+image_quality = 80
+image_grayscale = false
 
 [processing]
 docs_folder = "{docs_folder}"
 archive_folder = "{archive_folder}"
 max_file_size_mb = 50
 supported_formats = ["pdf", "png", "jpg", "jpeg"]
+cache_dir = ".cache"
+pdf_dpi = 200
+workers = 1
 
 [verification]
 max_age_months = 6
 min_consecutive_periods = 3
 require_qualified_accountant_signature = true
+income_deviation_threshold = 0.20
+early_exit_on_fraud = false
 
 [fraud_detection]
 confidence_threshold = 0.7
@@ -1,109 +1,350 @@
 """AI client abstraction for different providers."""
 
-import openai
-import anthropic
+import asyncio
+import json
+import time
+import types
 from abc import ABC, abstractmethod
-from typing import Optional, List, Dict, Any
+from contextlib import asynccontextmanager
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple, Callable, Union, TYPE_CHECKING
 import logging
 import base64
+import io
 from pathlib import Path
+from PIL import Image, ImageOps
+
+# Try to import pybase64 (SIMD base64), fall back to the stdlib encoder
+try:
+    import pybase64
+    PYBASE64_AVAILABLE = True
+except ImportError:
+    PYBASE64_AVAILABLE = False
+
+# Try to import orjson for faster response parsing, fall back to the stdlib
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 from .config import Config
 
+# The provider SDKs and httpx are imported when a client is built, so
+# commands that never call a model don't pay for them at startup
+if TYPE_CHECKING:
+    import httpx
+
 logger = logging.getLogger(__name__)
 
+_DATA_URL_PREFIX = "data:image/jpeg;base64,"
+_EXIF_ORIENTATION = 0x0112
+
+_JSON_DECODER = json.JSONDecoder()
+
+# Provider batch APIs bill at half the synchronous rate
+BATCH_DISCOUNT = 0.5
+
+# Pricing as of 2025, as (input, output) USD per token
+_OPENAI_PRICING = {
+    "gpt-4o-mini": (0.15e-6, 0.60e-6),  # $0.15 / $0.60 per 1M tokens
+    "gpt-4o": (2.50e-6, 10.00e-6),
+    "gpt-4": (30.00e-6, 60.00e-6),
+    "gpt-3.5-turbo": (0.50e-6, 1.50e-6),
+}
+_ANTHROPIC_PRICING = {
+    "claude-3-5-sonnet-20241022": (3.00e-6, 15.00e-6),  # $3 / $15 per 1M tokens
+    "claude-3-haiku-20240307": (0.25e-6, 1.25e-6),
+    "claude-3-opus-20240229": (15.00e-6, 75.00e-6),
+}
+
+
+def parse_response(text: str) -> Dict[str, Any]:
+    """Extract and decode the JSON object from a model response.
+    
+    Handles responses wrapped in markdown fences or surrounded by prose:
+    the object opened by the first '{' is decoded and anything after it
+    ignored. Raises json.JSONDecodeError (orjson's subclasses it) if there
+    is no object or it is truncated or malformed.
+    """
+    text = text.strip()
+    if text.startswith('{'):
+        # Bare JSON, the usual case
+        try:
+            if ORJSON_AVAILABLE:
+                return orjson.loads(text)
+            return json.loads(text)
+        except json.JSONDecodeError:
+            pass  # Possibly trailing prose; decode just the leading object
+    
+    start = text.find('{')
+    if start == -1:
+        raise json.JSONDecodeError("No JSON object found in response", text, 0)
+    # Never fall back to a later '{': that would return a nested object
+    # of a truncated response instead of failing
+    return _JSON_DECODER.raw_decode(text, start)[0]
+
+
+def _b64encode(data: bytes) -> str:
+    """Base64-encode image bytes straight to a str."""
+    if PYBASE64_AVAILABLE:
+        return pybase64.b64encode_as_string(data)
+    return base64.b64encode(data).decode('ascii')
+
+
+def _prompt_part(prompt: str) -> Dict[str, Any]:
+    """Text block for the prompt, shared when it is the standard analysis prompt."""
+    if prompt is _ANALYSIS_PROMPT:
+        return _PROMPT_PART
+    return {"type": "text", "text": prompt}
+
+
+def _extracted_text_parts(text_content: Optional[str]) -> List[Dict[str, Any]]:
+    """Content block carrying locally extracted text, if there is any."""
+    if not text_content:
+        return []
+    return [{"type": "text", "text": f"Extracted text content:\n{text_content}"}]
+
+
+_HTTPX_CLIENT: Optional["httpx.Client"] = None
+
+
+def _get_http_client() -> "httpx.Client":
+    """Return the process-wide HTTP/2 connection pool shared by the sync SDK clients."""
+    global _HTTPX_CLIENT
+    if _HTTPX_CLIENT is None:
+        import httpx
+        _HTTPX_CLIENT = httpx.Client(
+            http2=True,
+            timeout=60.0,
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
+        )
+    return _HTTPX_CLIENT
+
+
+def _create_async_http_client(config: Config) -> "httpx.AsyncClient":
+    """Create the pooled HTTP/2 transport used by the async SDK clients."""
+    import httpx
+    return httpx.AsyncClient(
+        http2=True,
+        timeout=60.0,
+        limits=httpx.Limits(max_connections=config.ai.max_concurrency)
+    )
+
 
 class AIClient(ABC):
     """Abstract base class for AI providers."""
     
+    config: Config
+    # Async SDK client, open only inside async_session()
+    aclient: Any = None
+    
+    def _create_async_client(self) -> Any:
+        """Build the provider's async SDK client; None if there is none."""
+        return None
+    
+    @asynccontextmanager
+    async def async_session(self) -> AsyncIterator[None]:
+        """Open the async SDK client for the running event loop, closing it on exit.
+        
+        httpx connection pools are bound to the loop that first uses them,
+        so each asyncio.run needs its own client.
+        """
+        aclient = self._create_async_client()
+        self.aclient = aclient
+        try:
+            yield
+        finally:
+            self.aclient = None
+            if aclient is not None:
+                await aclient.close()
+    
+    def _prepare_image(self, image_data: bytes) -> bytes:
+        """Downscale and re-encode an image as JPEG before upload.
+        
+        Vision models don't need full-resolution scans; capping the long edge
+        cuts upload bytes and image input tokens. Images that are already
+        small, upright JPEGs are sent unchanged; with ai.image_grayscale
+        only single-channel ones are. The EXIF orientation is applied before
+        re-encoding, since the tag doesn't survive it.
+        """
+        ai = self.config.ai
+        max_edge = ai.image_max_edge
+        mode = "L" if ai.image_grayscale else "RGB"
+        try:
+            img = Image.open(io.BytesIO(image_data))
+            upright = img.getexif().get(_EXIF_ORIENTATION, 1) == 1
+            if (img.format == "JPEG" and upright and max(img.size) <= max_edge
+                    and (mode == "RGB" or img.mode == "L")):
+                return image_data
+            
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+            output = io.BytesIO()
+            img.convert(mode).save(
+                output, "JPEG",
+                quality=ai.image_quality,
+                optimize=True,
+                progressive=True
+            )
+            return output.getvalue()
+        except Exception as e:
+            logger.warning(f"Image preparation failed, sending original bytes: {e}")
+            return image_data
+    
     @abstractmethod
+    def _prepare_request(self,
+                         image_data: bytes,
+                         prompt: str,
+                         text_content: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Build the provider message list, including the encoded image."""
+        pass
+    
+    @abstractmethod
+    def _send(self, messages: List[Dict[str, Any]]) -> str:
+        """Send prepared messages and return the response text."""
+        pass
+    
+    @abstractmethod
+    async def _send_async(self, messages: List[Dict[str, Any]]) -> str:
+        """Send prepared messages without blocking the event loop."""
+        pass
+    
     def analyze_document(self, 
                         image_data: bytes, 
                         prompt: str, 
                         text_content: Optional[str] = None) -> str:
-        """Analyze document with AI model."""
+        """Analyze document with AI model.
+        
+        The request is built once, so SDK retries resend the same payload
+        rather than re-encoding the image.
+        """
+        return self._send(self._prepare_request(image_data, prompt, text_content))
+    
+    async def analyze_document_async(self,
+                                     image_data: bytes,
+                                     prompt: str,
+                                     text_content: Optional[str] = None) -> str:
+        """Analyze document with AI model without blocking the event loop."""
+        return await self._send_async(self._prepare_request(image_data, prompt, text_content))
+    
+    async def analyze_documents(
+        self,
+        batch: List[Tuple[bytes, str, Optional[str]]],
+        on_complete: Optional[Callable[[int], None]] = None
+    ) -> List[Union[str, BaseException]]:
+        """Analyze a batch of documents concurrently.
+        
+        Requests are submitted together and bounded by ``ai.max_concurrency``
+        so network and model latency overlap instead of adding up. Results are
+        returned in input order; a failed request yields its exception rather
+        than cancelling the rest of the batch.
+        """
+        semaphore = asyncio.Semaphore(self.config.ai.max_concurrency)
+        
+        async def _bounded(index: int, image_data: bytes, prompt: str,
+                           text_content: Optional[str]) -> str:
+            try:
+                async with semaphore:
+                    return await self.analyze_document_async(image_data, prompt, text_content)
+            finally:
+                if on_complete:
+                    on_complete(index)
+        
+        async with self.async_session():
+            return await asyncio.gather(
+                *[_bounded(i, *item) for i, item in enumerate(batch)],
+                return_exceptions=True
+            )
+    
+    @abstractmethod
+    def submit_batch(self, items: List[Tuple[str, bytes, str, Optional[str]]]) -> str:
+        """Submit ``(custom_id, image_data, prompt, text_content)`` items as one batch job."""
         pass
+    
+    @abstractmethod
+    def _fetch_batch_results(self, batch_id: str) -> Optional[Dict[str, Union[str, Exception]]]:
+        """Return batch results keyed by custom_id, or None while the job is still running."""
+        pass
+    
+    def poll_batch(self,
+                   batch_id: str,
+                   initial_delay: float = 5.0,
+                   max_delay: float = 300.0) -> Dict[str, Union[str, Exception]]:
+        """Wait for a batch job to finish, backing off exponentially between checks."""
+        delay = initial_delay
+        while True:
+            results = self._fetch_batch_results(batch_id)
+            if results is not None:
+                return results
+            logger.info(f"Batch {batch_id} still processing, checking again in {delay:.0f}s")
+            time.sleep(delay)
+            delay = min(delay * 2, max_delay)
 
 
 class OpenAIClient(AIClient):
     """OpenAI client implementation."""
     
     def __init__(self, config: Config):
+        import openai
+        
         self.config = config
-        try:
-            # Initialize with minimal parameters to avoid proxy issues
-            self.client = openai.OpenAI(
-                api_key=config.get_api_key(),
-                timeout=60.0,
-                max_retries=2
-            )
-        except TypeError as e:
-            if "proxies" in str(e):
-                # Fallback for proxy-related initialization issues
-                logger.warning("Proxy parameter issue detected, trying alternative initialization")
-                import httpx
-                # Create a custom HTTP client without proxy parameters
-                http_client = httpx.Client(timeout=60.0)
-                self.client = openai.OpenAI(
-                    api_key=config.get_api_key(),
-                    http_client=http_client
-                )
-            else:
-                raise
-    
-    def _calculate_openai_cost(self, usage, model: str) -> float:
+        # Default to gpt-4o-mini pricing if model not found
+        self._rates = _OPENAI_PRICING.get(config.ai.model.lower(), _OPENAI_PRICING["gpt-4o-mini"])
+        self.client = openai.OpenAI(
+            api_key=config.get_api_key(),
+            http_client=_get_http_client(),
+            max_retries=config.ai.max_retries
+        )
+    
+    def _create_async_client(self) -> Any:
+        """Build an AsyncOpenAI client on a fresh connection pool."""
+        import openai
+        return openai.AsyncOpenAI(
+            api_key=self.config.get_api_key(),
+            http_client=_create_async_http_client(self.config),
+            max_retries=self.config.ai.max_retries
+        )
+    
+    def _calculate_openai_cost(self, usage) -> float:
         """Calculate cost for OpenAI API call based on token usage."""
-        # Pricing as of 2025 (per 1M tokens)
-        pricing = {
-            "gpt-4o-mini": {"input": 0.15, "output": 0.60},  # $0.15 / $0.60 per 1M tokens
-            "gpt-4o": {"input": 2.50, "output": 10.00},
-            "gpt-4": {"input": 30.00, "output": 60.00},
-            "gpt-3.5-turbo": {"input": 0.50, "output": 1.50},
-        }
-        
-        model_key = model.lower()
-        if model_key not in pricing:
-            # Default to gpt-4o-mini pricing if model not found
-            model_key = "gpt-4o-mini"
+        input_rate, output_rate = self._rates
+        return usage.prompt_tokens * input_rate + usage.completion_tokens * output_rate
+    
+    def _prepare_request(self,
+                         image_data: bytes,
+                         prompt: str,
+                         text_content: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Build the chat message payload for a vision request."""
+        # Encode image to base64
+        image_b64 = _b64encode(self._prepare_image(image_data))
         
-        input_cost = (usage.prompt_tokens / 1_000_000) * pricing[model_key]["input"]
-        output_cost = (usage.completion_tokens / 1_000_000) * pricing[model_key]["output"]
+        prompt_part = _prompt_part(prompt)
+        image_part = {
+            "type": "image_url",
+            "image_url": {
+                "url": _DATA_URL_PREFIX + image_b64
+            }
+        }
         
-        return input_cost + output_cost
+        return [
+            {
+                "role": "user",
+                "content": [prompt_part, *_extracted_text_parts(text_content), image_part]
+            }
+        ]
     
-    def analyze_document(self, 
-                        image_data: bytes, 
-                        prompt: str, 
-                        text_content: Optional[str] = None) -> str:
-        """Analyze document using OpenAI's vision model."""
+    def _log_usage(self, response) -> None:
+        """Log token usage and cost for a completed request."""
+        usage = getattr(response, 'usage', None)
+        if usage:
+            cost = self._calculate_openai_cost(usage)
+            logger.info(f"OpenAI API call - Input: {usage.prompt_tokens} tokens, "
+                      f"Output: {usage.completion_tokens} tokens, "
+                      f"Total: {usage.total_tokens} tokens, Cost: ${cost:.4f}")
+    
+    def _send(self, messages: List[Dict[str, Any]]) -> str:
+        """Send a request using OpenAI's vision model."""
         try:
-            # Encode image to base64
-            image_b64 = base64.b64encode(image_data).decode('utf-8')
-            
-            messages = [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": prompt
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_b64}"
-                            }
-                        }
-                    ]
-                }
-            ]
-            
-            if text_content:
-                messages[0]["content"].insert(1, {
-                    "type": "text",
-                    "text": f"Extracted text content:\n{text_content}"
-                })
-            
             response = self.client.chat.completions.create(
                 model=self.config.ai.model,
                 messages=messages,
@@ -111,119 +352,252 @@ class OpenAIClient(AIClient):
                 temperature=0.1
             )
             
-            # Log token usage and cost
-            if hasattr(response, 'usage') and response.usage:
-                cost = self._calculate_openai_cost(response.usage, self.config.ai.model)
-                logger.info(f"OpenAI API call - Input: {response.usage.prompt_tokens} tokens, "
-                          f"Output: {response.usage.completion_tokens} tokens, "
-                          f"Total: {response.usage.total_tokens} tokens, Cost: ${cost:.4f}")
+            self._log_usage(response)
+            return response.choices[0].message.content
+            
+        except Exception as e:
+            logger.error(f"OpenAI API error: {e}")
+            raise
+    
+    async def _send_async(self, messages: List[Dict[str, Any]]) -> str:
+        """Send a request using OpenAI's vision model (async)."""
+        try:
+            response = await self.aclient.chat.completions.create(
+                model=self.config.ai.model,
+                messages=messages,
+                max_tokens=4000,
+                temperature=0.1
+            )
             
+            self._log_usage(response)
             return response.choices[0].message.content
             
         except Exception as e:
             logger.error(f"OpenAI API error: {e}")
             raise
+    
+    def submit_batch(self, items: List[Tuple[str, bytes, str, Optional[str]]]) -> str:
+        """Upload a JSONL request file and start an OpenAI batch job."""
+        lines = []
+        for custom_id, image_data, prompt, text_content in items:
+            lines.append(json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.config.ai.model,
+                    "messages": self._prepare_request(image_data, prompt, text_content),
+                    "max_tokens": 4000,
+                    "temperature": 0.1
+                }
+            }))
+        
+        try:
+            batch_file = self.client.files.create(
+                file=("batch.jsonl", "\n".join(lines).encode('utf-8'), "application/jsonl"),
+                purpose="batch"
+            )
+            batch = self.client.batches.create(
+                input_file_id=batch_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            )
+        except Exception as e:
+            logger.error(f"OpenAI batch submission error: {e}")
+            raise
+        
+        logger.info(f"Submitted OpenAI batch {batch.id} with {len(items)} documents")
+        return batch.id
+    
+    def _fetch_batch_results(self, batch_id: str) -> Optional[Dict[str, Union[str, Exception]]]:
+        """Collect OpenAI batch output once the job has completed."""
+        batch = self.client.batches.retrieve(batch_id)
+        if batch.status in ("validating", "in_progress", "finalizing", "cancelling"):
+            return None
+        if batch.status != "completed":
+            raise RuntimeError(f"OpenAI batch {batch_id} ended with status: {batch.status}")
+        
+        results: Dict[str, Union[str, Exception]] = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                response = record.get("response") or {}
+                if record.get("error") or response.get("status_code") != 200:
+                    error = record.get("error") or response.get("body")
+                    results[record["custom_id"]] = RuntimeError(
+                        f"OpenAI batch request failed: {error}"
+                    )
+                    continue
+                
+                body = response["body"]
+                if body.get("usage"):
+                    usage = types.SimpleNamespace(**body["usage"])
+                    cost = self._calculate_openai_cost(usage) * BATCH_DISCOUNT
+                    logger.info(f"OpenAI batch result - Input: {usage.prompt_tokens} tokens, "
+                              f"Output: {usage.completion_tokens} tokens, "
+                              f"Total: {usage.total_tokens} tokens, Cost: ${cost:.4f}")
+                results[record["custom_id"]] = body["choices"][0]["message"]["content"]
+        
+        return results
 
 
 class AnthropicClient(AIClient):
     """Anthropic client implementation."""
     
     def __init__(self, config: Config):
+        import anthropic
+        
         self.config = config
-        try:
-            # Initialize with minimal parameters to avoid proxy issues
-            self.client = anthropic.Anthropic(
-                api_key=config.get_api_key(),
-                timeout=60.0,
-                max_retries=2
-            )
-        except TypeError as e:
-            if "proxies" in str(e):
-                # Fallback for proxy-related initialization issues
-                logger.warning("Proxy parameter issue detected, trying alternative initialization")
-                import httpx
-                # Create a custom HTTP client without proxy parameters
-                http_client = httpx.Client(timeout=60.0)
-                self.client = anthropic.Anthropic(
-                    api_key=config.get_api_key(),
-                    http_client=http_client
-                )
-            else:
-                raise
-    
-    def _calculate_anthropic_cost(self, usage, model: str) -> float:
+        # Default to Claude 3.5 Sonnet pricing if model not found
+        self._rates = _ANTHROPIC_PRICING.get(config.ai.model.lower(),
+                                             _ANTHROPIC_PRICING["claude-3-5-sonnet-20241022"])
+        self.client = anthropic.Anthropic(
+            api_key=config.get_api_key(),
+            http_client=_get_http_client(),
+            max_retries=config.ai.max_retries
+        )
+    
+    def _create_async_client(self) -> Any:
+        """Build an AsyncAnthropic client on a fresh connection pool."""
+        import anthropic
+        return anthropic.AsyncAnthropic(
+            api_key=self.config.get_api_key(),
+            http_client=_create_async_http_client(self.config),
+            max_retries=self.config.ai.max_retries
+        )
+    
+    def _calculate_anthropic_cost(self, usage) -> float:
         """Calculate cost for Anthropic API call based on token usage."""
-        # Pricing as of 2025 (per 1M tokens)
-        pricing = {
-            "claude-3-5-sonnet-20241022": {"input": 3.00, "output": 15.00},  # $3 / $15 per 1M tokens
-            "claude-3-haiku-20240307": {"input": 0.25, "output": 1.25},
-            "claude-3-opus-20240229": {"input": 15.00, "output": 75.00},
-        }
-        
-        model_key = model.lower()
-        if model_key not in pricing:
-            # Default to Claude 3.5 Sonnet pricing if model not found
-            model_key = "claude-3-5-sonnet-20241022"
+        input_rate, output_rate = self._rates
+        return usage.input_tokens * input_rate + usage.output_tokens * output_rate
+    
+    def _build_content(self,
+                       image_data: bytes,
+                       prompt: str,
+                       text_content: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Build the message content blocks for a vision request."""
+        # Encode image to base64
+        image_b64 = _b64encode(self._prepare_image(image_data))
         
-        input_cost = (usage.input_tokens / 1_000_000) * pricing[model_key]["input"]
-        output_cost = (usage.output_tokens / 1_000_000) * pricing[model_key]["output"]
+        image_part = {
+            "type": "image",
+            "source": {
+                "type": "base64",
+                "media_type": "image/jpeg",
+                "data": image_b64
+            }
+        }
+        prompt_part = _prompt_part(prompt)
         
-        return input_cost + output_cost
+        return [image_part, *_extracted_text_parts(text_content), prompt_part]
     
-    def analyze_document(self, 
-                        image_data: bytes, 
-                        prompt: str, 
-                        text_content: Optional[str] = None) -> str:
-        """Analyze document using Anthropic's vision model."""
+    def _log_usage(self, response) -> None:
+        """Log token usage and cost for a completed request."""
+        usage = getattr(response, 'usage', None)
+        if usage:
+            cost = self._calculate_anthropic_cost(usage)
+            total_tokens = usage.input_tokens + usage.output_tokens
+            logger.info(f"Anthropic API call - Input: {usage.input_tokens} tokens, "
+                      f"Output: {usage.output_tokens} tokens, "
+                      f"Total: {total_tokens} tokens, Cost: ${cost:.4f}")
+    
+    def _prepare_request(self,
+                         image_data: bytes,
+                         prompt: str,
+                         text_content: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Build the message list for a vision request."""
+        return [
+            {
+                "role": "user",
+                "content": self._build_content(image_data, prompt, text_content)
+            }
+        ]
+    
+    def _send(self, messages: List[Dict[str, Any]]) -> str:
+        """Send a request using Anthropic's vision model."""
         try:
-            # Encode image to base64
-            image_b64 = base64.b64encode(image_data).decode('utf-8')
-            
-            content = [
-                {
-                    "type": "image",
-                    "source": {
-                        "type": "base64",
-                        "media_type": "image/jpeg",
-                        "data": image_b64
-                    }
-                },
-                {
-                    "type": "text",
-                    "text": prompt
-                }
-            ]
-            
-            if text_content:
-                content.insert(1, {
-                    "type": "text",
-                    "text": f"Extracted text content:\n{text_content}"
-                })
-            
             response = self.client.messages.create(
                 model=self.config.ai.model,
                 max_tokens=4000,
                 temperature=0.1,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": content
-                    }
-                ]
+                messages=messages
             )
             
-            # Log token usage and cost
-            if hasattr(response, 'usage') and response.usage:
-                cost = self._calculate_anthropic_cost(response.usage, self.config.ai.model)
-                logger.info(f"Anthropic API call - Input: {response.usage.input_tokens} tokens, "
-                          f"Output: {response.usage.output_tokens} tokens, "
-                          f"Total: {response.usage.input_tokens + response.usage.output_tokens} tokens, Cost: ${cost:.4f}")
+            self._log_usage(response)
+            return response.content[0].text
+            
+        except Exception as e:
+            logger.error(f"Anthropic API error: {e}")
+            raise
+    
+    async def _send_async(self, messages: List[Dict[str, Any]]) -> str:
+        """Send a request using Anthropic's vision model (async)."""
+        try:
+            response = await self.aclient.messages.create(
+                model=self.config.ai.model,
+                max_tokens=4000,
+                temperature=0.1,
+                messages=messages
+            )
             
+            self._log_usage(response)
             return response.content[0].text
             
         except Exception as e:
             logger.error(f"Anthropic API error: {e}")
             raise
+    
+    def submit_batch(self, items: List[Tuple[str, bytes, str, Optional[str]]]) -> str:
+        """Start an Anthropic message batch job."""
+        requests = [
+            {
+                "custom_id": custom_id,
+                "params": {
+                    "model": self.config.ai.model,
+                    "max_tokens": 4000,
+                    "temperature": 0.1,
+                    "messages": self._prepare_request(image_data, prompt, text_content)
+                }
+            }
+            for custom_id, image_data, prompt, text_content in items
+        ]
+        
+        try:
+            batch = self.client.beta.messages.batches.create(requests=requests)
+        except Exception as e:
+            logger.error(f"Anthropic batch submission error: {e}")
+            raise
+        
+        logger.info(f"Submitted Anthropic batch {batch.id} with {len(items)} documents")
+        return batch.id
+    
+    def _fetch_batch_results(self, batch_id: str) -> Optional[Dict[str, Union[str, Exception]]]:
+        """Collect Anthropic batch output once processing has ended."""
+        batch = self.client.beta.messages.batches.retrieve(batch_id)
+        if batch.processing_status != "ended":
+            return None
+        
+        results: Dict[str, Union[str, Exception]] = {}
+        for entry in self.client.beta.messages.batches.results(batch_id):
+            if entry.result.type != "succeeded":
+                error = getattr(entry.result, "error", entry.result.type)
+                results[entry.custom_id] = RuntimeError(f"Anthropic batch request failed: {error}")
+                continue
+            
+            message = entry.result.message
+            usage = message.usage
+            cost = self._calculate_anthropic_cost(usage) * BATCH_DISCOUNT
+            total_tokens = usage.input_tokens + usage.output_tokens
+            logger.info(f"Anthropic batch result - Input: {usage.input_tokens} tokens, "
+                      f"Output: {usage.output_tokens} tokens, "
+                      f"Total: {total_tokens} tokens, Cost: ${cost:.4f}")
+            results[entry.custom_id] = message.content[0].text
+        
+        return results
 
 
 def create_ai_client(config: Config) -> AIClient:
@@ -238,7 +612,10 @@ def create_ai_client(config: Config) -> AIClient:
 
 def get_analysis_prompt() -> str:
     """Get the structured prompt for document analysis."""
-    return """
+    return _ANALYSIS_PROMPT
+
+
+_ANALYSIS_PROMPT = """
 You are a financial document analysis expert. Analyze this document and extract structured information.
 
 Please identify:
@@ -288,4 +665,7 @@ Return your analysis as a JSON object with this exact structure:
 }
 
 Focus on accuracy and provide confidence scores based on text clarity and data consistency.
-"""
\ No newline at end of file
+"""
+
+# Reused across requests; treat as read-only
+_PROMPT_PART = {"type": "text", "text": _ANALYSIS_PROMPT}
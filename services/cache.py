@@ -0,0 +1,75 @@
+"""Content-addressed on-disk caching for AI responses and document analyses."""
+
+import hashlib
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def response_cache_key(image_data: bytes, prompt: str, model: str, image_settings: tuple) -> str:
+    """Build a cache key from the document image, prompt, model and upload settings.
+
+    model is qualified with the provider, e.g. "openai:gpt-4o-mini", and
+    image_settings are the options the client re-encodes the image with
+    before upload. The key covers every input that determines the response,
+    so entries never need invalidating: a new prompt, model or setting
+    simply produces new keys.
+    """
+    prompt_hash = hashlib.blake2b(prompt.encode('utf-8'), digest_size=8).hexdigest()
+    image_hash = hashlib.blake2b(image_data, digest_size=16).hexdigest()
+    settings = repr((model, image_settings)).encode('utf-8')
+    settings_hash = hashlib.blake2b(settings, digest_size=4).hexdigest()
+    return f"{image_hash}-{settings_hash}-{prompt_hash}"
+
+
+def analysis_cache_key(file_hash: str, prompt: str, model: str, render_settings: tuple) -> str:
+    """Build a cache key for a document's extracted analysis.
+
+    file_hash is the loader's content hash of the source file; the prompt,
+    model and image rendering settings cover everything else that shapes the
+    extracted analysis, so changing any of them simply produces new keys.
+    """
+    settings = repr((prompt, model, render_settings)).encode('utf-8')
+    settings_hash = hashlib.blake2b(settings, digest_size=8).hexdigest()
+    return f"{file_hash}-{settings_hash}"
+
+
+class ContentCache:
+    """Immutable key/value store with one file per key under cache_dir."""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = Path(cache_dir)
+
+    def _path_for(self, key: str) -> Path:
+        """Shard entries by key prefix to keep directories small."""
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the cached value for key, or None on a miss."""
+        try:
+            return self._path_for(key).read_bytes()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Cache read failed for {key}: {e}")
+            return None
+
+    def put(self, key: str, value: bytes) -> None:
+        """Store value under key, atomically replacing any existing entry."""
+        path = self._path_for(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(value)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError as e:
+            logger.warning(f"Cache write failed for {key}: {e}")
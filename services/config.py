@@ -1,8 +1,14 @@
 """Configuration management for the Payslip Intelligence Suite."""
 
-import toml
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    import tomli as tomllib
+import copy
+import os
+from functools import cached_property
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 
 
@@ -11,6 +17,12 @@ class AIConfig:
     provider: str
     model: str
     api_key_file: str
+    max_concurrency: int = 4
+    max_retries: int = 5
+    mode: str = "sync"
+    image_max_edge: int = 1600
+    image_quality: int = 80
+    image_grayscale: bool = False
 
 
 @dataclass
@@ -19,6 +31,9 @@ class ProcessingConfig:
     archive_folder: str
     max_file_size_mb: int
     supported_formats: List[str]
+    cache_dir: str = ".cache"
+    pdf_dpi: int = 200
+    workers: int = 1
 
 
 @dataclass
@@ -26,6 +41,8 @@ class VerificationConfig:
     max_age_months: int
     min_consecutive_periods: int
     require_qualified_accountant_signature: bool
+    income_deviation_threshold: float = 0.20
+    early_exit_on_fraud: bool = False
 
 
 @dataclass
@@ -53,25 +70,51 @@ class Config:
 
     @classmethod
     def load(cls, config_path: str = "config.toml") -> "Config":
-        """Load configuration from TOML file."""
-        config_file = Path(config_path)
-        if not config_file.exists():
-            raise FileNotFoundError(f"Configuration file not found: {config_path}")
+        """Load configuration from TOML file.
         
-        data = toml.load(config_file)
+        Parsed configs are cached per file (device, inode) and reused while
+        the mtime and size from a single fstat() still match. Each call
+        returns its own copy, so callers may adjust it freely.
+        """
+        try:
+            f = open(config_path, "rb")
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Configuration file not found: {config_path}") from None
         
-        return cls(
+        with f:
+            stat = os.fstat(f.fileno())
+            file_id = (stat.st_dev, stat.st_ino)
+            version = (stat.st_mtime_ns, stat.st_size)
+            
+            cached = _CONFIG_CACHE.get(file_id)
+            if cached is not None and cached[0] == version:
+                return copy.deepcopy(cached[1])
+            
+            data = tomllib.load(f)
+        
+        config = cls(
             ai=AIConfig(**data["ai"]),
             processing=ProcessingConfig(**data["processing"]),
             verification=VerificationConfig(**data["verification"]),
             fraud_detection=FraudDetectionConfig(**data["fraud_detection"]),
             output=OutputConfig(**data["output"])
         )
+        _CONFIG_CACHE[file_id] = (version, copy.deepcopy(config))
+        return config
 
-    def get_api_key(self) -> str:
-        """Load API key from the specified file."""
+    @cached_property
+    def api_key(self) -> str:
+        """API key read from the specified file, loaded once per Config instance."""
         key_path = Path(self.ai.api_key_file)
         if not key_path.exists():
             raise FileNotFoundError(f"API key file not found: {self.ai.api_key_file}")
         
-        return key_path.read_text().strip()
\ No newline at end of file
+        return key_path.read_text().strip()
+
+    def get_api_key(self) -> str:
+        """Load API key from the specified file."""
+        return self.api_key
+
+
+# Parsed configs keyed by (st_dev, st_ino) -> ((st_mtime_ns, st_size), Config)
+_CONFIG_CACHE: Dict[Tuple[int, int], Tuple[Tuple[int, int], Config]] = {}
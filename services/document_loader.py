@@ -1,12 +1,16 @@
 """Document loading and file management."""
 
 import os
+import errno
+import mmap
+import json
 import shutil
 import hashlib
 from pathlib import Path
 from datetime import datetime
-from typing import List, Set, Tuple
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 # Try to import magic, fall back to extension-based detection
 try:
@@ -16,11 +20,29 @@ except ImportError:
     MAGIC_AVAILABLE = False
     logging.warning("python-magic not available, using extension-based file type detection")
 
+# Try to import blake3 (SIMD, multi-threaded hashing), fall back to hashlib BLAKE2b
+try:
+    import blake3
+    BLAKE3_AVAILABLE = True
+except ImportError:
+    BLAKE3_AVAILABLE = False
+
 from .config import Config
 from .models import ProcessingMetadata
 
 logger = logging.getLogger(__name__)
 
+DEDUP_CACHE_FILE = ".dedup_cache.json"
+HASH_WORKERS = min(8, os.cpu_count() or 1)
+
+# Leading bytes of each supported format, and the extensions they stand for
+MAGIC_SIGNATURES = (
+    (b'%PDF', ('pdf',)),
+    (b'\x89PNG\r\n\x1a\n', ('png',)),
+    (b'\xff\xd8\xff', ('jpg', 'jpeg')),
+)
+MAGIC_HEAD_SIZE = 8
+
 
 class DocumentLoader:
     """Handles document loading, deduplication, and archiving."""
@@ -29,29 +51,117 @@ class DocumentLoader:
         self.config = config
         self.docs_folder = Path(config.processing.docs_folder)
         self.archive_folder = Path(config.processing.archive_folder)
+        self.supported_formats = frozenset(
+            fmt.lower().lstrip('.') for fmt in config.processing.supported_formats
+        )
+        self.max_file_size_bytes = config.processing.max_file_size_mb * 1024 * 1024
         self.processed_hashes: Set[str] = set()
+        # Content hash of each file returned by the last scan
+        self.content_hashes: Dict[Path, str] = {}
+        # Subdirectories of docs_folder seen by the last scan, parents first
+        self._scanned_dirs: Optional[List[str]] = None
+        # Next collision suffix to try, per (archive subdir, stem, suffix)
+        self._archive_counters: Dict[Tuple[Path, str, str], int] = {}
         
         # Create directories if they don't exist
         self.docs_folder.mkdir(exist_ok=True)
         self.archive_folder.mkdir(exist_ok=True)
+        
+        # Content hashes of files seen in earlier scans, keyed on
+        # "inode:size:mtime_ns" so unchanged files aren't re-read
+        self._stat_cache_path = self.archive_folder / DEDUP_CACHE_FILE
+        self._stat_cache: Dict[str, str] = self._load_stat_cache()
+    
+    def _load_stat_cache(self) -> Dict[str, str]:
+        """Load the persisted stat -> content hash cache, if any."""
+        try:
+            with open(self._stat_cache_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable dedup cache {self._stat_cache_path}: {e}")
+            return {}
+    
+    def _save_stat_cache(self) -> None:
+        """Persist the stat -> content hash cache for the next run."""
+        tmp_path = self._stat_cache_path.with_suffix('.tmp')
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self._stat_cache, f)
+            os.replace(tmp_path, self._stat_cache_path)
+        except OSError as e:
+            logger.warning(f"Could not save dedup cache {self._stat_cache_path}: {e}")
+    
+    def _hash_candidates(self, candidates: List[Tuple[Path, os.stat_result]]) -> List[str]:
+        """Content-hash candidate files, in order.
+        
+        Hashes are reused when inode, size and mtime are unchanged since an
+        earlier scan; the rest are read in parallel since hashing releases
+        the GIL. Rebuilds the stat cache from the files seen.
+        """
+        keys = [f"{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}" for _, stat in candidates]
+        hashes = {key: self._stat_cache[key] for key in keys if key in self._stat_cache}
+        
+        misses = [(key, file_path) for key, (file_path, _) in zip(keys, candidates)
+                  if key not in hashes]
+        if misses:
+            with ThreadPoolExecutor(max_workers=min(HASH_WORKERS, len(misses))) as executor:
+                fresh = executor.map(self.get_file_hash, [file_path for _, file_path in misses])
+                hashes.update(zip((key for key, _ in misses), fresh))
+        
+        # Keep only entries for files still present so the cache stays bounded
+        if hashes != self._stat_cache:
+            self._stat_cache = hashes
+            self._save_stat_cache()
+        
+        return [hashes[key] for key in keys]
     
     def get_file_hash(self, file_path: Path) -> str:
-        """Generate MD5 hash of file contents."""
-        hash_md5 = hashlib.md5()
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
+        """Generate a 128-bit content fingerprint for deduplication."""
+        if BLAKE3_AVAILABLE:
+            hasher = blake3.blake3(max_threads=blake3.blake3.AUTO)
+            hasher.update_mmap(file_path)
+            return hasher.hexdigest(length=16)
+        
+        # Hash the whole file as one memory-mapped buffer: a single update()
+        # call that releases the GIL, with the kernel paging the file in
+        hasher = hashlib.blake2b(digest_size=16)
+        with open(file_path, "rb", buffering=0) as f:
+            if os.fstat(f.fileno()).st_size:  # Empty files can't be mapped
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    hasher.update(mapped)
+        return hasher.hexdigest()
     
     def is_supported_format(self, file_path: Path) -> bool:
-        """Check if file format is supported."""
+        """Check if file format is supported.
+        
+        The extension decides whenever there is one; only extension-less
+        files have their contents sniffed.
+        """
         extension = file_path.suffix.lower().lstrip('.')
+        if extension:
+            return extension in self.supported_formats
+        
+        return self._sniff_supported_format(file_path)
+    
+    def _sniff_supported_format(self, file_path: Path) -> bool:
+        """Detect a supported format from file contents.
+        
+        The first few bytes are matched against MAGIC_SIGNATURES; libmagic
+        and its full signature database are only used for unknown headers.
+        """
+        try:
+            with open(file_path, 'rb') as f:
+                head = f.read(MAGIC_HEAD_SIZE)
+        except OSError as e:
+            logger.warning(f"Could not read {file_path} for type detection: {e}")
+            return False
+        
+        for signature, extensions in MAGIC_SIGNATURES:
+            if head.startswith(signature):
+                return not self.supported_formats.isdisjoint(extensions)
         
-        # Check by extension first
-        if extension in self.config.processing.supported_formats:
-            return True
-            
-        # If magic is available, also check MIME type
         if MAGIC_AVAILABLE:
             try:
                 mime_type = magic.from_file(str(file_path), mime=True)
@@ -65,84 +175,147 @@ class DocumentLoader:
             except Exception as e:
                 logger.warning(f"Magic file type detection failed for {file_path}: {e}")
         
-        # Fallback to extension-only check
-        return extension in ['pdf', 'png', 'jpg', 'jpeg']
+        return False
     
-    def is_valid_file_size(self, file_path: Path) -> bool:
-        """Check if file size is within limits."""
-        size_mb = file_path.stat().st_size / (1024 * 1024)
-        return size_mb <= self.config.processing.max_file_size_mb
+    def is_valid_file_size(self, file_path: Path, *,
+                           stat_result: Optional[os.stat_result] = None) -> bool:
+        """Check if file size is within limits.
+        
+        Pass stat_result (e.g. a DirEntry's cached stat) to skip the stat() call.
+        """
+        if stat_result is None:
+            stat_result = file_path.stat()
+        return stat_result.st_size <= self.max_file_size_bytes
+    
+    def _scandir_recursive(self, path: str) -> Iterator[os.DirEntry]:
+        """Yield regular, non-hidden files below path.
+        
+        DirEntry carries the file type from readdir and caches its stat
+        result, so each file costs at most one stat() call. Symlinks are not
+        followed. Subdirectories are recorded, parents first, for
+        cleanup_empty_directories.
+        """
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.name.startswith('.') or entry.is_symlink():
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    self._scanned_dirs.append(entry.path)
+                    yield from self._scandir_recursive(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
     
     def scan_for_new_files(self) -> List[Tuple[Path, ProcessingMetadata]]:
         """Scan docs folder for new, valid files."""
-        new_files = []
+        candidates = []
+        self._scanned_dirs = []
+        supported_formats = self.supported_formats
+        max_bytes = self.max_file_size_bytes
         
-        for file_path in self.docs_folder.rglob("*"):
-            if not file_path.is_file():
+        for entry in self._scandir_recursive(str(self.docs_folder)):
+            # Cheapest checks first, all on the DirEntry: extension, then size
+            # (stat is cached), then file contents; Path only for survivors
+            extension = os.path.splitext(entry.name)[1].lower().lstrip('.')
+            if extension and extension not in supported_formats:
+                logger.info(f"Skipping unsupported file: {entry.path}")
                 continue
             
-            # Skip hidden files
-            if file_path.name.startswith('.'):
+            # Check file size against the stat DirEntry cached during the scan
+            stat = entry.stat()
+            if stat.st_size > max_bytes:
+                logger.warning(f"File too large, skipping: {entry.path}")
                 continue
             
-            # Check if supported format
-            if not self.is_supported_format(file_path):
+            file_path = Path(entry.path)
+            if not extension and not self._sniff_supported_format(file_path):
                 logger.info(f"Skipping unsupported file: {file_path}")
                 continue
             
-            # Check file size
-            if not self.is_valid_file_size(file_path):
-                logger.warning(f"File too large, skipping: {file_path}")
-                continue
-            
-            # Check for duplicates
-            file_hash = self.get_file_hash(file_path)
+            candidates.append((file_path, stat))
+        
+        # Hash in parallel, then dedup on this thread so processed_hashes needs no lock
+        new_files = []
+        self.content_hashes = {}
+        scan_time = datetime.now()
+        for (file_path, stat), file_hash in zip(candidates, self._hash_candidates(candidates)):
             if file_hash in self.processed_hashes:
                 logger.info(f"Duplicate file detected, skipping: {file_path}")
                 continue
             
-            # Create processing metadata
-            metadata = ProcessingMetadata(
+            # Create processing metadata from trusted stat values
+            metadata = ProcessingMetadata.model_construct(
                 file_path=str(file_path),
-                file_size_bytes=file_path.stat().st_size,
-                processing_timestamp=datetime.now(),
+                file_size_bytes=stat.st_size,
+                processing_timestamp=scan_time,
                 ocr_quality_score=0.0,  # Will be set during processing
                 pages_processed=0  # Will be set during processing
             )
             
             new_files.append((file_path, metadata))
+            self.content_hashes[file_path] = file_hash
             self.processed_hashes.add(file_hash)
         
         logger.info(f"Found {len(new_files)} new files to process")
         return new_files
     
-    def archive_file(self, file_path: Path) -> Path:
-        """Move processed file to archive folder organized by year-month."""
-        now = datetime.now()
+    def archive_file(self, file_path: Path, now: Optional[datetime] = None) -> Path:
+        """Move processed file to archive folder organized by year-month.
+        
+        Pass now to file a whole batch under one timestamp.
+        """
+        if now is None:
+            now = datetime.now()
         archive_subdir = self.archive_folder / f"{now.year:04d}-{now.month:02d}"
         archive_subdir.mkdir(exist_ok=True)
         
-        # Generate unique filename if collision
-        archive_path = archive_subdir / file_path.name
-        counter = 1
-        while archive_path.exists():
-            stem = archive_path.stem
-            suffix = archive_path.suffix
-            archive_path = archive_subdir / f"{stem}_{counter}{suffix}"
-            counter += 1
+        archive_path = self._reserve_archive_path(archive_subdir, file_path)
+        try:
+            # Same filesystem: a single atomic rename over the reserved placeholder
+            os.replace(file_path, archive_path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                archive_path.unlink(missing_ok=True)
+                raise
+            # Cross-device: kernel-side copy (sendfile/copy_file_range), then remove source
+            shutil.copy2(file_path, archive_path)
+            os.unlink(file_path)
         
-        shutil.move(str(file_path), str(archive_path))
         logger.info(f"Archived {file_path} to {archive_path}")
         return archive_path
     
+    def _reserve_archive_path(self, archive_subdir: Path, file_path: Path) -> Path:
+        """Claim a free name in archive_subdir, suffixing _1, _2, ... on collision.
+        
+        The name is created with O_EXCL so concurrent archivers can't pick
+        the same destination. The next suffix per name is remembered, so
+        repeated collisions don't re-probe every earlier candidate.
+        """
+        key = (archive_subdir, file_path.stem, file_path.suffix)
+        counter = self._archive_counters.get(key, 0)
+        while True:
+            if counter == 0:
+                archive_path = archive_subdir / file_path.name
+            else:
+                archive_path = archive_subdir / f"{file_path.stem}_{counter}{file_path.suffix}"
+            try:
+                os.close(os.open(archive_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+                self._archive_counters[key] = counter + 1
+                return archive_path
+            except FileExistsError:
+                counter += 1
+    
     def cleanup_empty_directories(self):
-        """Remove empty directories from docs folder."""
-        for root, dirs, files in os.walk(self.docs_folder, topdown=False):
-            for dir_name in dirs:
-                dir_path = Path(root) / dir_name
-                try:
-                    if not any(dir_path.iterdir()):
-                        dir_path.rmdir()
-                        logger.debug(f"Removed empty directory: {dir_path}")
-                except OSError:
-                    pass  # Directory not empty or permission denied
\ No newline at end of file
+        """Remove empty directories from docs folder.
+        
+        Reuses the directories seen by the last scan, deepest first, so no
+        second tree walk is needed; rmdir itself refuses non-empty ones.
+        """
+        if self._scanned_dirs is None:
+            self._scanned_dirs = [root for root, _, _ in os.walk(self.docs_folder)][1:]
+        
+        for dir_path in reversed(self._scanned_dirs):
+            try:
+                os.rmdir(dir_path)
+                logger.debug(f"Removed empty directory: {dir_path}")
+            except OSError:
+                pass  # Directory not empty or permission denied
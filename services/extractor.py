@@ -2,19 +2,45 @@
 
 import json
 import logging
+import mmap
+import os
+import re
 from pathlib import Path
-from typing import Optional, Tuple
-from datetime import datetime
+from typing import Optional, Tuple, Union
+from datetime import date, datetime
 from PIL import Image
-import PyPDF2
+import pypdfium2 as pdfium
 import io
 
 from .config import Config
-from .models import DocumentAnalysis, ProcessingMetadata, DocumentType
-from .ai_client import AIClient, get_analysis_prompt
+from .models import (
+    DocumentAnalysis, ProcessingMetadata, DocumentType, Employee, Employer,
+    PayPeriod, Verifications
+)
+from .ai_client import AIClient, get_analysis_prompt, parse_response
+from .similarity import text_fingerprint
 
 logger = logging.getLogger(__name__)
 
+# Value -> member lookup that skips the Enum call machinery
+_DOCUMENT_TYPES = DocumentType._value2member_map_
+
+
+def _safe_parse_date(date_str) -> Optional[date]:
+    """Safely parse a YYYY-MM-DD string, returning None if missing or invalid."""
+    if not date_str or date_str == "null":
+        return None
+    try:
+        return datetime.strptime(date_str, '%Y-%m-%d').date()
+    except (ValueError, TypeError):
+        return None
+
+
+# Common OCR errors, fused into one alternation
+_OCR_ERROR_RE = re.compile(
+    "|".join(re.escape(error) for error in ['�', '|||', '###', 'l1l', 'O0o'])
+)
+
 
 class DocumentExtractor:
     """Handles document processing and data extraction."""
@@ -22,69 +48,113 @@ class DocumentExtractor:
     def __init__(self, config: Config, ai_client: AIClient):
         self.config = config
         self.ai_client = ai_client
+        self._prompt = get_analysis_prompt()
     
     def extract_text_from_pdf(self, file_path: Path) -> Tuple[str, int]:
         """Extract text content from PDF."""
         try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text_content = ""
-                pages_processed = len(pdf_reader.pages)
-                
-                for page_num, page in enumerate(pdf_reader.pages):
-                    try:
-                        page_text = page.extract_text()
-                        text_content += f"--- Page {page_num + 1} ---\n{page_text}\n\n"
-                    except Exception as e:
-                        logger.warning(f"Error extracting text from page {page_num + 1}: {e}")
-                
-                return text_content.strip(), pages_processed
-                
+            pdf = pdfium.PdfDocument(file_path)
         except Exception as e:
             logger.error(f"Error extracting text from PDF {file_path}: {e}")
             return "", 0
+        
+        try:
+            pages_processed = len(pdf)
+            text_parts = [
+                self._page_text(pdf[page_num], page_num) for page_num in range(pages_processed)
+            ]
+            return "".join(text_parts).strip(), pages_processed
+        finally:
+            pdf.close()
+    
+    def _page_text(self, page, page_num: int) -> str:
+        """Text of one PDF page under a page marker, or "" if extraction fails."""
+        try:
+            return f"--- Page {page_num + 1} ---\n{page.get_textpage().get_text_range()}\n\n"
+        except Exception as e:
+            logger.warning(f"Error extracting text from page {page_num + 1}: {e}")
+            return ""
     
     def convert_pdf_to_image(self, file_path: Path, page_num: int = 0) -> bytes:
         """Convert PDF page to image bytes."""
         try:
-            from pdf2image import convert_from_path
-            # Convert first page of PDF to PIL Image
-            images = convert_from_path(
-                str(file_path), 
-                first_page=page_num + 1, 
-                last_page=page_num + 1,
-                dpi=200  # High DPI for better quality
-            )
-            
-            if images:
-                # Convert PIL Image to bytes
-                img_bytes = io.BytesIO()
-                images[0].save(img_bytes, format='PNG')
-                return img_bytes.getvalue()
-            else:
-                raise ValueError("No images generated from PDF")
-                
-        except ImportError:
-            # Fallback: use PIL to create a placeholder image
-            logger.warning("pdf2image not available, using placeholder image")
-            img = Image.new('RGB', (800, 1000), color='white')
-            img_bytes = io.BytesIO()
-            img.save(img_bytes, format='PNG')
-            return img_bytes.getvalue()
+            pdf = pdfium.PdfDocument(file_path)
+            try:
+                return self._render_page(pdf[page_num])
+            finally:
+                pdf.close()
         except Exception as e:
             logger.error(f"Error converting PDF to image: {e}")
-            # Fallback: use PIL to create a placeholder image
             logger.warning("PDF conversion failed, using placeholder image")
-            img = Image.new('RGB', (800, 1000), color='white')
-            img_bytes = io.BytesIO()
-            img.save(img_bytes, format='PNG')
-            return img_bytes.getvalue()
+            return self._placeholder_image()
+    
+    def _render_page(self, page) -> bytes:
+        """Render a PDF page as JPEG at the configured DPI.
+        
+        The scale is capped so the long edge fits ai.image_max_edge, so the
+        AI client can upload the result without decoding and resizing it.
+        With ai.image_grayscale, PDFium renders a single channel directly.
+        """
+        ai = self.config.ai
+        width, height = page.get_size()  # PDF points, 72 per inch
+        scale = min(self.config.processing.pdf_dpi / 72, ai.image_max_edge / max(width, height))
+        
+        img_bytes = io.BytesIO()
+        page.render(scale=scale, grayscale=ai.image_grayscale).to_pil().save(
+            img_bytes, format='JPEG', quality=ai.image_quality, optimize=True
+        )
+        return img_bytes.getvalue()
+    
+    def _extract_pdf(self, file_path: Path) -> Tuple[str, int, bytes]:
+        """Extract text from every page and render only the first, opening the PDF once."""
+        try:
+            pdf = pdfium.PdfDocument(file_path)
+        except Exception as e:
+            logger.error(f"Error opening PDF {file_path}: {e}")
+            logger.warning("PDF conversion failed, using placeholder image")
+            return "", 0, self._placeholder_image()
+        
+        try:
+            pages_processed = len(pdf)
+            text_parts = []
+            image_data = None
+            
+            for page_num in range(pages_processed):
+                page = pdf[page_num]
+                text_parts.append(self._page_text(page, page_num))
+                
+                if page_num == 0:
+                    try:
+                        image_data = self._render_page(page)
+                    except Exception as e:
+                        logger.error(f"Error converting PDF to image: {e}")
+            
+            if image_data is None:
+                logger.warning("PDF conversion failed, using placeholder image")
+                image_data = self._placeholder_image()
+            
+            return "".join(text_parts).strip(), pages_processed, image_data
+        finally:
+            pdf.close()
     
-    def load_image_file(self, file_path: Path) -> bytes:
-        """Load image file as bytes."""
+    def _placeholder_image(self) -> bytes:
+        """Blank page image sent when a PDF can't be rendered."""
+        img = Image.new('RGB', (800, 1000), color='white')
+        img_bytes = io.BytesIO()
+        img.save(img_bytes, format='PNG')
+        return img_bytes.getvalue()
+    
+    def load_image_file(self, file_path: Path) -> Union[bytes, mmap.mmap]:
+        """Load image file as a read-only, bytes-like memory map.
+        
+        The page cache backs the buffer, so hashing and base64 encoding read
+        the file without a heap copy. Callers close the map when done.
+        """
         try:
             with open(file_path, 'rb') as f:
-                return f.read()
+                if os.fstat(f.fileno()).st_size == 0:
+                    return b""  # Empty files can't be mapped
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
         except Exception as e:
             logger.error(f"Error loading image file {file_path}: {e}")
             raise
@@ -98,9 +168,8 @@ class DocumentExtractor:
         text_length = len(text_content)
         word_count = len(text_content.split())
         
-        # Check for common OCR errors
-        common_errors = ['�', '|||', '###', 'l1l', 'O0o']
-        error_count = sum(text_content.count(error) for error in common_errors)
+        # Check for common OCR errors in a single scan
+        error_count = len(_OCR_ERROR_RE.findall(text_content))
         
         # Calculate quality score
         if word_count == 0:
@@ -117,29 +186,7 @@ class DocumentExtractor:
     def parse_ai_response(self, response: str) -> dict:
         """Parse and validate AI response JSON."""
         try:
-            # Extract JSON from response (handles cases where AI adds extra text)
-            response = response.strip()
-            if '```json' in response:
-                start = response.find('```json') + 7
-                end = response.find('```', start)
-                response = response[start:end].strip()
-            elif '```' in response:
-                start = response.find('```') + 3
-                end = response.find('```', start)
-                response = response[start:end].strip()
-            
-            # Find JSON object boundaries
-            if not response.startswith('{'):
-                start = response.find('{')
-                if start != -1:
-                    response = response[start:]
-            
-            if not response.endswith('}'):
-                end = response.rfind('}')
-                if end != -1:
-                    response = response[:end + 1]
-            
-            return json.loads(response)
+            return parse_response(response)
             
         except json.JSONDecodeError as e:
             logger.error(f"Failed to parse AI response as JSON: {e}")
@@ -150,153 +197,172 @@ class DocumentExtractor:
                                ai_response: dict, 
                                metadata: ProcessingMetadata, 
                                text_content: str) -> DocumentAnalysis:
-        """Create DocumentAnalysis object from AI response."""
+        """Create DocumentAnalysis object from AI response.
+        
+        The response is normalised into one nested dict (lenient dates,
+        defaults, unknown document types) and validated in a single
+        model_validate call, so pydantic-core checks the whole tree at once.
+        """
         try:
-            # Parse the AI response into our data models
-            from .models import (
-                Employee, Employer, PayPeriod, Income, Verifications,
-                DocumentType, IncomeType, PayFrequency
-            )
-            from datetime import datetime, date as date_type
-            
             # Document type
-            doc_type = DocumentType(ai_response.get('document_type', 'other'))
-            
-            # Employee info
-            emp_data = ai_response.get('employee', {})
-            employee = Employee(
-                name=emp_data.get('name'),
-                ni_number=emp_data.get('ni_number'),
-                employee_id=emp_data.get('employee_id'),
-                confidence=emp_data.get('confidence', 0.0)
-            )
+            document_type = ai_response.get('document_type', 'other')
+            try:
+                doc_type = _DOCUMENT_TYPES[document_type]
+            except KeyError:
+                raise ValueError(f"{document_type!r} is not a valid DocumentType") from None
             
-            # Employer info
-            emp_data = ai_response.get('employer', {})
-            employer = Employer(
-                name=emp_data.get('name'),
-                address=emp_data.get('address'),
-                company_registration=emp_data.get('company_registration'),
-                confidence=emp_data.get('confidence', 0.0)
-            )
-            
-            # Pay period with safe date parsing
+            employee_data = ai_response.get('employee', {})
+            employer_data = ai_response.get('employer', {})
             period_data = ai_response.get('pay_period', {})
             
-            def safe_parse_date(date_str):
-                """Safely parse date string, return None if invalid."""
-                if not date_str or date_str == "null":
-                    return None
-                try:
-                    return datetime.strptime(date_str, '%Y-%m-%d').date()
-                except (ValueError, TypeError):
-                    return None
-            
-            pay_period = PayPeriod(
-                start_date=safe_parse_date(period_data.get('start_date')),
-                end_date=safe_parse_date(period_data.get('end_date')),
-                pay_date=safe_parse_date(period_data.get('pay_date')),
-                frequency=PayFrequency(period_data['frequency'])
-                    if period_data.get('frequency') and period_data['frequency'] != "null" else None,
-                confidence=period_data.get('confidence', 0.0)
-            )
-            
-            # Income items
-            income_items = []
-            for item in ai_response.get('income', []):
-                income_items.append(Income(
-                    type=IncomeType(item['type']),
-                    amount_gbp=float(item['amount_gbp']),
-                    description=item.get('description'),
-                    confidence=item.get('confidence', 0.0)
-                ))
+            # Pay period with safe date parsing
+            pay_date = _safe_parse_date(period_data.get('pay_date'))
+            frequency = period_data.get('frequency')
             
-            # Verifications (will be filled by verifier)
-            verifications = Verifications(
-                recency_pass=False,
-                consecutive_pass=False,
-                qualified_signature_pass=None,
-                total_consistency_pass=False,
-                date_format_pass=bool(pay_period.pay_date)
-            )
+            raw_text = text_content[:1000] if text_content else None  # Truncate for storage
             
-            return DocumentAnalysis(
-                document_type=doc_type,
-                employee=employee,
-                employer=employer,
-                pay_period=pay_period,
-                income=income_items,
-                total_gross_pay=ai_response.get('total_gross_pay'),
-                total_net_pay=ai_response.get('total_net_pay'),
-                verifications=verifications,
-                fraud_signals=ai_response.get('fraud_signals', []),
-                overall_confidence=ai_response.get('overall_confidence', 0.0),
-                processing_metadata=metadata,
-                raw_text=text_content[:1000] if text_content else None  # Truncate for storage
-            )
+            return DocumentAnalysis.model_validate({
+                'document_type': doc_type,
+                'employee': {
+                    'name': employee_data.get('name'),
+                    'ni_number': employee_data.get('ni_number'),
+                    'employee_id': employee_data.get('employee_id'),
+                    'confidence': employee_data.get('confidence', 0.0)
+                },
+                'employer': {
+                    'name': employer_data.get('name'),
+                    'address': employer_data.get('address'),
+                    'company_registration': employer_data.get('company_registration'),
+                    'confidence': employer_data.get('confidence', 0.0)
+                },
+                'pay_period': {
+                    'start_date': _safe_parse_date(period_data.get('start_date')),
+                    'end_date': _safe_parse_date(period_data.get('end_date')),
+                    'pay_date': pay_date,
+                    'frequency': frequency if frequency and frequency != "null" else None,
+                    'confidence': period_data.get('confidence', 0.0)
+                },
+                'income': [
+                    {
+                        'type': item['type'],
+                        'amount_gbp': float(item['amount_gbp']),
+                        'description': item.get('description'),
+                        'confidence': item.get('confidence', 0.0)
+                    }
+                    for item in ai_response.get('income', [])
+                ],
+                'total_gross_pay': ai_response.get('total_gross_pay'),
+                'total_net_pay': ai_response.get('total_net_pay'),
+                # Verifications (will be filled by verifier)
+                'verifications': {
+                    'recency_pass': False,
+                    'consecutive_pass': False,
+                    'qualified_signature_pass': None,
+                    'total_consistency_pass': False,
+                    'date_format_pass': bool(pay_date)
+                },
+                'fraud_signals': ai_response.get('fraud_signals', []),
+                'overall_confidence': ai_response.get('overall_confidence', 0.0),
+                'processing_metadata': metadata,
+                'raw_text': raw_text,
+                # Shingled once here so batch template detection only compares signatures
+                'text_fingerprint': text_fingerprint(raw_text) if raw_text else None
+            })
             
         except Exception as e:
             logger.error(f"Error creating DocumentAnalysis: {e}")
             raise
     
+    def prepare_document(
+        self, file_path: Path, metadata: ProcessingMetadata
+    ) -> Tuple[Union[bytes, mmap.mmap], str, ProcessingMetadata]:
+        """Extract local content (image + text) ready for AI analysis.
+        
+        Returns the image, the text and a copy of metadata carrying the OCR
+        quality score and page count.
+        """
+        # Determine file type and extract content
+        if file_path.suffix.lower() == '.pdf':
+            text_content, pages_processed, image_data = self._extract_pdf(file_path)
+        else:
+            # Image file
+            text_content = ""
+            pages_processed = 1
+            image_data = self.load_image_file(file_path)
+        
+        metadata = metadata.model_copy(update={
+            'ocr_quality_score': self.calculate_ocr_quality(text_content, metadata.file_size_bytes),
+            'pages_processed': pages_processed
+        })
+        
+        return image_data, text_content, metadata
+    
+    def build_analysis(self,
+                       ai_response_text: str,
+                       metadata: ProcessingMetadata,
+                       text_content: str) -> DocumentAnalysis:
+        """Parse the AI response and build the structured analysis."""
+        ai_response = self.parse_ai_response(ai_response_text)
+        analysis = self.create_document_analysis(ai_response, metadata, text_content)
+        
+        logger.info(f"Successfully processed {metadata.file_path} as {analysis.document_type}")
+        return analysis
+    
+    def create_error_analysis(self, metadata: ProcessingMetadata,
+                              error: Exception) -> DocumentAnalysis:
+        """Return a minimal analysis recording a processing error.
+        
+        All values are fixed here, so validation is skipped.
+        """
+        return DocumentAnalysis.model_construct(
+            document_type=DocumentType.OTHER,
+            employee=Employee.model_construct(confidence=0.0),
+            employer=Employer.model_construct(confidence=0.0),
+            pay_period=PayPeriod.model_construct(confidence=0.0),
+            income=[],
+            verifications=Verifications.model_construct(
+                recency_pass=False,
+                consecutive_pass=False,
+                total_consistency_pass=False,
+                date_format_pass=False
+            ),
+            fraud_signals=[f"Processing error: {str(error)}"],
+            overall_confidence=0.0,
+            processing_metadata=metadata,
+            raw_text=None
+        )
+    
     def process_document(self, file_path: Path, metadata: ProcessingMetadata) -> DocumentAnalysis:
         """Process a single document and extract structured data."""
         logger.info(f"Processing document: {file_path}")
         
         try:
-            # Determine file type and extract content
-            if file_path.suffix.lower() == '.pdf':
-                text_content, pages_processed = self.extract_text_from_pdf(file_path)
-                image_data = self.convert_pdf_to_image(file_path)
-            else:
-                # Image file
-                text_content = ""
-                pages_processed = 1
-                image_data = self.load_image_file(file_path)
-            
-            # Update metadata
-            metadata.ocr_quality_score = self.calculate_ocr_quality(
-                text_content, metadata.file_size_bytes
-            )
-            metadata.pages_processed = pages_processed
+            image_data, text_content, metadata = self.prepare_document(file_path, metadata)
             
             # Get AI analysis
-            prompt = get_analysis_prompt()
-            ai_response_text = self.ai_client.analyze_document(
-                image_data, prompt, text_content if text_content else None
-            )
+            try:
+                ai_response_text = self.ai_client.analyze_document(
+                    image_data, self._prompt, text_content if text_content else None
+                )
+            finally:
+                if isinstance(image_data, mmap.mmap):
+                    image_data.close()
             
-            # Parse AI response
-            ai_response = self.parse_ai_response(ai_response_text)
-            
-            # Create structured analysis
-            analysis = self.create_document_analysis(ai_response, metadata, text_content)
-            
-            logger.info(f"Successfully processed {file_path} as {analysis.document_type}")
-            return analysis
+            return self.build_analysis(ai_response_text, metadata, text_content)
             
         except Exception as e:
             logger.error(f"Error processing document {file_path}: {e}")
-            # Import models for error case
-            from .models import (
-                Employee, Employer, PayPeriod, Verifications,
-                DocumentType
-            )
-            # Return a minimal analysis with error info
-            return DocumentAnalysis(
-                document_type=DocumentType.OTHER,
-                employee=Employee(confidence=0.0),
-                employer=Employer(confidence=0.0),
-                pay_period=PayPeriod(confidence=0.0),
-                income=[],
-                verifications=Verifications(
-                    recency_pass=False,
-                    consecutive_pass=False,
-                    total_consistency_pass=False,
-                    date_format_pass=False
-                ),
-                fraud_signals=[f"Processing error: {str(e)}"],
-                overall_confidence=0.0,
-                processing_metadata=metadata,
-                raw_text=None
-            )
\ No newline at end of file
+            return self.create_error_analysis(metadata, e)
+
+
+def prepare_document_in_worker(
+    config: Config, file_path: Path, metadata: ProcessingMetadata
+) -> Tuple[bytes, str, ProcessingMetadata]:
+    """Process-pool entry point: prepare one document and return the updated metadata."""
+    extractor = DocumentExtractor(config, None)
+    image_data, text_content, metadata = extractor.prepare_document(file_path, metadata)
+    try:
+        return bytes(image_data), text_content, metadata
+    finally:
+        if isinstance(image_data, mmap.mmap):
+            image_data.close()
@@ -1,22 +1,59 @@
 """Fraud detection service using heuristic and ML techniques."""
 
 import re
+import math
 import logging
-from typing import List, Dict, Any, Set
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from itertools import combinations, repeat
+from operator import attrgetter
+from typing import List, Dict, Any, Optional, Set
 from collections import Counter
 import textdistance
+import numpy as np
 
 from .config import Config
 from .models import DocumentAnalysis, DocumentType
+from .similarity import minhash_signature, signature_from_fingerprint, lsh_candidate_pairs
+from .worker_logging import pool_initializer
 
 logger = logging.getLogger(__name__)
 
+_WHITESPACE_RE = re.compile(r'\s+')
+_amount_gbp = attrgetter('amount_gbp')
+# Signals that reduce document confidence when present
+_HIGH_RISK_SIGNALS = frozenset({
+    'calculation_mismatch', 'invalid_date_order', 'fake_ni_number',
+    'unrealistic_high_amount', 'future_pay_date'
+})
+_MEDIUM_RISK_SIGNALS = frozenset({
+    'suspicious_employer_name', 'inconsistent_spacing',
+    'no_company_suffix', 'suspicious_round_amount'
+})
+
+# Per-document checks take microseconds, so process start-up and pickling
+# only pay off on large batches
+PARALLEL_MIN_DOCUMENTS = 256
+
+# Batches up to this size compare every pair of texts exactly; larger ones
+# only confirm the pairs proposed by MinHash LSH
+TEMPLATE_EXACT_SCAN_MAX_DOCUMENTS = 32
+
+# Non-ASCII characters other than common accented Latin letters
+_SUSPICIOUS_UNICODE_RE = re.compile(r'[^\x00-\x7fàáâãäåæçèéêëìíîïñòóôõöøùúûü]')
+
+
+def _literal_alternation(words: List[str]) -> re.Pattern:
+    """Compile words into one pattern matching any of them as a plain substring."""
+    return re.compile("|".join(map(re.escape, words)))
+
 
 class FraudDetector:
     """Detects potential fraud indicators in financial documents."""
     
     def __init__(self, config: Config):
         self.config = config
+        self._settings = config.fraud_detection
         
         # Common fraud patterns
         self.suspicious_patterns = {
@@ -43,6 +80,33 @@ class FraudDetector:
             'tax_codes': [r'[0-9]{3,4}[LMN]', r'BR', r'NT', r'D0'],
             'ni_patterns': [r'[A-Z]{2}\d{6}[A-Z]']
         }
+        
+        # Substrings that make an employer name suspicious
+        self.suspicious_employer_words = ['cash', 'money', 'payment', 'temp', 'agency']
+        
+        # Obviously fake NI numbers
+        self.fake_ni_patterns = [
+            r'^AA000000A$',
+            r'^[A-Z]{2}000000[A-Z]$',
+            r'^[A-Z]{2}123456[A-Z]$'
+        ]
+        
+        # Compile once, fusing each category into a single alternation.
+        # Only the repeated-digits amount pattern has a capturing group, so
+        # its \1 backreference still refers to group 1 after fusing.
+        self._suspicious_re = {
+            category: re.compile("|".join(f"(?:{pattern})" for pattern in patterns))
+            for category, patterns in self.suspicious_patterns.items()
+        }
+        self._ni_re = re.compile(r'^[A-Z]{2}\d{6}[A-Z]$')
+        self._fake_ni_re = re.compile(
+            "|".join(f"(?:{pattern})" for pattern in self.fake_ni_patterns)
+        )
+        # One scan of the employer name per word list instead of one per word
+        self._company_suffix_re = _literal_alternation(
+            self.legitimate_indicators['company_suffixes']
+        )
+        self._suspicious_employer_re = _literal_alternation(self.suspicious_employer_words)
     
     def analyze_text_consistency(self, analysis: DocumentAnalysis) -> List[str]:
         """Analyze text for consistency issues."""
@@ -54,14 +118,12 @@ class FraudDetector:
         text = analysis.raw_text
         
         # Check for suspicious patterns
-        for category, patterns in self.suspicious_patterns.items():
-            for pattern in patterns:
-                if re.search(pattern, text):
-                    fraud_signals.append(f"suspicious_{category}")
-                    break
+        for category, pattern in self._suspicious_re.items():
+            if pattern.search(text):
+                fraud_signals.append(f"suspicious_{category}")
         
         # Font consistency check
-        if self.config.fraud_detection.font_consistency_check:
+        if self._settings.font_consistency_check:
             fraud_signals.extend(self._check_font_consistency(text))
         
         return fraud_signals
@@ -70,23 +132,13 @@ class FraudDetector:
         """Check for font inconsistencies that might indicate tampering."""
         fraud_signals = []
         
-        # Look for mixed character encodings
-        try:
-            text.encode('ascii')
-        except UnicodeEncodeError:
-            # Check for suspicious unicode characters
-            suspicious_chars = set()
-            for char in text:
-                if ord(char) > 127 and char not in 'àáâãäåæçèéêëìíîïñòóôõöøùúûü':
-                    suspicious_chars.add(char)
-            
-            if suspicious_chars:
-                fraud_signals.append("suspicious_unicode_characters")
+        # Look for mixed character encodings (isascii is a C scan, no copy)
+        if not text.isascii() and _SUSPICIOUS_UNICODE_RE.search(text):
+            fraud_signals.append("suspicious_unicode_characters")
         
         # Check for inconsistent spacing patterns
-        space_patterns = re.findall(r'\s+', text)
-        if space_patterns:
-            space_lengths = [len(pattern) for pattern in space_patterns]
+        space_lengths = list(map(len, _WHITESPACE_RE.findall(text)))
+        if space_lengths:
             # If there's high variation in spacing, it might indicate manual editing
             if max(space_lengths) > min(space_lengths) * 3:
                 fraud_signals.append("inconsistent_spacing")
@@ -97,12 +149,12 @@ class FraudDetector:
         """Validate mathematical calculations in the document."""
         fraud_signals = []
         
-        if not self.config.fraud_detection.total_validation:
+        if not self._settings.total_validation:
             return fraud_signals
         
         # Check if totals match sum of line items
         if analysis.income and analysis.total_gross_pay:
-            calculated_total = sum(item.amount_gbp for item in analysis.income)
+            calculated_total = math.fsum(map(_amount_gbp, analysis.income))
             declared_total = analysis.total_gross_pay
             
             tolerance = 0.02  # 2 pence tolerance
@@ -145,17 +197,13 @@ class FraudDetector:
         employer_name = analysis.employer.name.lower()
         
         # Check for legitimate company indicators
-        has_legitimate_suffix = any(
-            suffix in employer_name 
-            for suffix in self.legitimate_indicators['company_suffixes']
-        )
+        has_legitimate_suffix = self._company_suffix_re.search(employer_name) is not None
         
-        if not has_legitimate_suffix and analysis.document_type == DocumentType.PAYSLIP:
+        if not has_legitimate_suffix and analysis.document_type is DocumentType.PAYSLIP:
             fraud_signals.append("no_company_suffix")
         
         # Check for suspicious employer names
-        suspicious_words = ['cash', 'money', 'payment', 'temp', 'agency']
-        if any(word in employer_name for word in suspicious_words):
+        if self._suspicious_employer_re.search(employer_name):
             fraud_signals.append("suspicious_employer_name")
         
         # Check for single word employer names (often suspicious)
@@ -164,15 +212,16 @@ class FraudDetector:
         
         return fraud_signals
     
-    def analyze_date_patterns(self, analysis: DocumentAnalysis) -> List[str]:
+    def analyze_date_patterns(self, analysis: DocumentAnalysis,
+                              today: Optional[date] = None) -> List[str]:
         """Analyze date patterns for anomalies."""
         fraud_signals = []
         
         pay_period = analysis.pay_period
         
         # Check for future dates
-        from datetime import date
-        today = date.today()
+        if today is None:
+            today = date.today()
         
         if pay_period.pay_date and pay_period.pay_date > today:
             fraud_signals.append("future_pay_date")
@@ -201,41 +250,42 @@ class FraudDetector:
         ni_number = analysis.employee.ni_number.upper().replace(' ', '')
         
         # UK NI number format: 2 letters + 6 digits + 1 letter
-        ni_pattern = r'^[A-Z]{2}\d{6}[A-Z]$'
-        
-        if not re.match(ni_pattern, ni_number):
+        if not self._ni_re.match(ni_number):
             fraud_signals.append("invalid_ni_format")
-        else:
-            # Check for obviously fake NI numbers
-            fake_patterns = [
-                r'^AA000000A$',
-                r'^[A-Z]{2}000000[A-Z]$',
-                r'^[A-Z]{2}123456[A-Z]$'
-            ]
-            
-            if any(re.match(pattern, ni_number) for pattern in fake_patterns):
-                fraud_signals.append("fake_ni_number")
+        elif self._fake_ni_re.match(ni_number):
+            # Obviously fake NI number
+            fraud_signals.append("fake_ni_number")
         
         return fraud_signals
     
     def detect_template_usage(self, analyses: List[DocumentAnalysis]) -> Dict[str, Any]:
-        """Detect if multiple documents use the same template (potential fraud)."""
+        """Detect if multiple documents use the same template (potential fraud).
+        
+        Above TEMPLATE_EXACT_SCAN_MAX_DOCUMENTS, similarities and their
+        average cover only the LSH candidate pairs.
+        """
         if len(analyses) < 2:
             return {}
         
-        # Compare raw text similarity
+        with_text = [i for i, analysis in enumerate(analyses) if analysis.raw_text]
+        if len(with_text) <= TEMPLATE_EXACT_SCAN_MAX_DOCUMENTS:
+            candidate_pairs = combinations(with_text, 2)
+        else:
+            # Only pairs whose MinHash signatures share an LSH band are compared
+            # exactly, instead of running Jaro-Winkler over every pair
+            candidate_pairs = lsh_candidate_pairs(
+                (i, self._text_signature(analyses[i])) for i in with_text
+            )
         text_similarities = []
-        for i in range(len(analyses)):
-            for j in range(i + 1, len(analyses)):
-                if analyses[i].raw_text and analyses[j].raw_text:
-                    similarity = textdistance.jaro_winkler(
-                        analyses[i].raw_text, analyses[j].raw_text
-                    )
-                    text_similarities.append({
-                        'doc1_index': i,
-                        'doc2_index': j,
-                        'similarity': similarity
-                    })
+        for i, j in candidate_pairs:
+            similarity = textdistance.jaro_winkler(
+                analyses[i].raw_text, analyses[j].raw_text
+            )
+            text_similarities.append({
+                'doc1_index': i,
+                'doc2_index': j,
+                'similarity': similarity
+            })
         
         # Flag high similarity (potential template reuse)
         suspicious_pairs = [
@@ -249,49 +299,65 @@ class FraudDetector:
             'average_similarity': sum(p['similarity'] for p in text_similarities) / len(text_similarities) if text_similarities else 0
         }
     
-    def analyze_document(self, analysis: DocumentAnalysis) -> DocumentAnalysis:
-        """Run fraud detection analysis on a single document."""
+    def _text_signature(self, analysis: DocumentAnalysis) -> np.ndarray:
+        """MinHash signature of raw_text, reusing the one stored at extraction."""
+        if analysis.text_fingerprint is not None:
+            return signature_from_fingerprint(analysis.text_fingerprint)
+        return minhash_signature(analysis.raw_text)
+    
+    def analyze_document(self, analysis: DocumentAnalysis,
+                         today: Optional[date] = None) -> DocumentAnalysis:
+        """Run fraud detection analysis on a single document.
+        
+        today defaults to the current date; batches pass it in once.
+        """
         fraud_signals = set(analysis.fraud_signals)  # Start with existing signals
         
         # Run various fraud detection checks
         fraud_signals.update(self.analyze_text_consistency(analysis))
         fraud_signals.update(self.validate_calculations(analysis))
         fraud_signals.update(self.check_employer_legitimacy(analysis))
-        fraud_signals.update(self.analyze_date_patterns(analysis))
+        fraud_signals.update(self.analyze_date_patterns(analysis, today))
         fraud_signals.update(self.check_ni_number_validity(analysis))
         
+        # Calculate fraud risk penalty
+        high_risk_count = len(fraud_signals & _HIGH_RISK_SIGNALS)
+        medium_risk_count = len(fraud_signals & _MEDIUM_RISK_SIGNALS)
+        
         # Update analysis with new fraud signals
         analysis.fraud_signals = list(fraud_signals)
         
-        # Adjust confidence based on fraud signals
-        high_risk_signals = [
-            'calculation_mismatch', 'invalid_date_order', 'fake_ni_number',
-            'unrealistic_high_amount', 'future_pay_date'
-        ]
-        
-        medium_risk_signals = [
-            'suspicious_employer_name', 'inconsistent_spacing',
-            'no_company_suffix', 'suspicious_round_amount'
-        ]
-        
-        # Calculate fraud risk penalty
-        high_risk_count = sum(1 for signal in analysis.fraud_signals if signal in high_risk_signals)
-        medium_risk_count = sum(1 for signal in analysis.fraud_signals if signal in medium_risk_signals)
-        
         fraud_penalty = (high_risk_count * 0.25) + (medium_risk_count * 0.10)
         analysis.overall_confidence = max(0.0, analysis.overall_confidence - fraud_penalty)
         
         # Flag document as high fraud risk if confidence drops too low
-        if analysis.overall_confidence < self.config.fraud_detection.confidence_threshold:
+        if analysis.overall_confidence < self._settings.confidence_threshold:
             analysis.fraud_signals.append("high_fraud_risk")
         
         logger.info(f"Fraud analysis complete: {len(analysis.fraud_signals)} signals detected")
         return analysis
     
+    def _analyze_documents_parallel(self, analyses: List[DocumentAnalysis],
+                                    today: date, workers: int) -> List[DocumentAnalysis]:
+        """Run analyze_document across worker processes, keeping input order.
+        
+        The checks are independent per document, so each worker analyzes
+        pickled copies; the returned analyses replace the inputs.
+        """
+        chunksize = max(1, len(analyses) // (4 * workers))
+        with ProcessPoolExecutor(max_workers=workers, **pool_initializer()) as executor:
+            return list(executor.map(self.analyze_document, analyses, repeat(today),
+                                     chunksize=chunksize))
+    
     def analyze_batch(self, analyses: List[DocumentAnalysis]) -> List[DocumentAnalysis]:
         """Run fraud detection on a batch of documents."""
         # Analyze individual documents
-        analyzed_docs = [self.analyze_document(analysis) for analysis in analyses]
+        today = date.today()
+        workers = self.config.processing.workers
+        if workers > 1 and len(analyses) >= PARALLEL_MIN_DOCUMENTS:
+            analyzed_docs = self._analyze_documents_parallel(analyses, today, workers)
+        else:
+            analyzed_docs = [self.analyze_document(analysis, today) for analysis in analyses]
         
         # Check for template reuse across documents
         template_analysis = self.detect_template_usage(analyzed_docs)
@@ -2,8 +2,9 @@
 
 from datetime import datetime, date
 from enum import Enum
-from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field
+from pathlib import Path
+from typing import List, Optional, Dict, Any, Union
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 
 
 class DocumentType(str, Enum):
@@ -57,14 +58,20 @@ class PayPeriod(BaseModel):
 
 
 class Verifications(BaseModel):
+    # Immutable value object; derive updated flags with model_copy(update=...)
+    model_config = ConfigDict(frozen=True)
+    
     recency_pass: bool
     consecutive_pass: bool
     qualified_signature_pass: Optional[bool] = None
-    total_consistency_pass: bool
+    total_consistency_pass: Optional[bool]  # None when skipped by early exit
     date_format_pass: bool
 
 
 class ProcessingMetadata(BaseModel):
+    # Immutable value object; derive updated fields with model_copy(update=...)
+    model_config = ConfigDict(frozen=True)
+    
     file_path: str
     file_size_bytes: int
     processing_timestamp: datetime
@@ -85,6 +92,8 @@ class DocumentAnalysis(BaseModel):
     overall_confidence: float = Field(ge=0.0, le=1.0)
     processing_metadata: ProcessingMetadata
     raw_text: Optional[str] = None
+    # MinHash signature of raw_text, computed at extraction; not serialized
+    text_fingerprint: Optional[bytes] = Field(default=None, exclude=True)
 
 
 class BatchResult(BaseModel):
@@ -93,4 +102,14 @@ class BatchResult(BaseModel):
     processing_timestamp: datetime
     total_files_processed: int
     successful_extractions: int
-    failed_extractions: int
\ No newline at end of file
+    failed_extractions: int
+
+
+# Built once at import; creating adapters per call rebuilds the core schema
+DOCUMENT_ANALYSIS_ADAPTER = TypeAdapter(DocumentAnalysis)
+BATCH_RESULT_ADAPTER = TypeAdapter(BatchResult)
+
+
+def load_batch_result(path: Union[str, Path]) -> BatchResult:
+    """Reload a saved batch summary, validating straight from the JSON bytes."""
+    return BATCH_RESULT_ADAPTER.validate_json(Path(path).read_bytes())
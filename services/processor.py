@@ -1,32 +1,81 @@
 """Main processing orchestrator for the Payslip Intelligence Suite."""
 
-import json
+import asyncio
+import atexit
 import logging
-from datetime import datetime
+import mmap
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from logging.handlers import QueueListener
 from pathlib import Path
-from typing import List
-from rich.console import Console
-from rich.table import Table
-from rich.progress import Progress, TaskID
+from functools import cached_property
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
 from .config import Config
-from .models import BatchResult, DocumentAnalysis
+from .models import BatchResult, DocumentAnalysis, DOCUMENT_ANALYSIS_ADAPTER, BATCH_RESULT_ADAPTER
 from .document_loader import DocumentLoader
-from .extractor import DocumentExtractor
+from .extractor import DocumentExtractor, prepare_document_in_worker
+from .similarity import text_fingerprint
 from .verifier import DocumentVerifier
 from .fraud_detector import FraudDetector
-from .ai_client import create_ai_client
+from .ai_client import create_ai_client, get_analysis_prompt
+from .cache import ContentCache, analysis_cache_key, response_cache_key
+from .worker_logging import create_log_queue, make_queue_handler, pool_initializer
 import re
 
+# Rich is imported where it is used, so library callers and batch jobs
+# that never print don't pay for it at import time
+if TYPE_CHECKING:
+    from rich.console import Console
+    from rich.progress import Progress, TaskID
+
 logger = logging.getLogger(__name__)
 
+WRITE_WORKERS = 16
+
+
+def _truncate(text: str, width: int) -> str:
+    """Cut text to width characters plus an ellipsis when it is over width + 3."""
+    return text if len(text) <= width + 3 else text[:width] + "..."
+
+
+def _format_fraud_signals(fraud_signals: List[str]) -> str:
+    """Render fraud signals as readable, comma-separated lines for the summary table."""
+    if not fraud_signals:
+        return "Clean"
+    
+    # Convert underscored signals to readable format
+    readable_signals = [signal.replace('_', ' ').title() for signal in fraud_signals]
+    
+    # Join signals with comma and space, wrap if too long
+    fraud_display = ", ".join(readable_signals)
+    if len(fraud_display) <= 60:
+        return fraud_display
+    
+    # Split long lists across lines
+    lines = []
+    current_line = ""
+    for word in readable_signals:
+        if len(current_line + word) > 35:
+            if current_line:
+                lines.append(current_line.rstrip(", "))
+                current_line = word + ", "
+            else:
+                lines.append(word)
+        else:
+            current_line += word + ", "
+    if current_line:
+        lines.append(current_line.rstrip(", "))
+    return "\n".join(lines)
+
 
 class PayslipProcessor:
     """Main orchestrator for document processing pipeline."""
     
     def __init__(self, config_path: str = "config.toml"):
         self.config = Config.load(config_path)
-        self.console = Console()
         
         # Initialize services
         self.loader = DocumentLoader(self.config)
@@ -34,24 +83,49 @@ class PayslipProcessor:
         self.extractor = DocumentExtractor(self.config, self.ai_client)
         self.verifier = DocumentVerifier(self.config)
         self.fraud_detector = FraudDetector(self.config)
+        cache_dir = self.config.processing.cache_dir
+        self.response_cache = ContentCache(cache_dir) if cache_dir else None
+        # Extracted analyses (before verification) keyed by file content and settings
+        self.analysis_cache = (
+            ContentCache(os.path.join(cache_dir, "analyses")) if cache_dir else None
+        )
         
         # Cost tracking
         self.total_cost = 0.0
         
+        # Monotonic start of the last batch, for elapsed time unaffected by clock changes
+        self._batch_started: Optional[float] = None
+        
         # Setup logging
         self._setup_logging()
     
+    @cached_property
+    def console(self) -> "Console":
+        """Rich console, created on first use."""
+        from rich.console import Console
+        return Console()
+    
     def _setup_logging(self):
         """Configure logging based on config."""
         log_level = getattr(logging, self.config.output.log_level.upper())
-        logging.basicConfig(
-            level=log_level,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.StreamHandler(),
-                logging.FileHandler('payslip_processor.log')
-            ]
-        )
+        # basicConfig is a no-op once the root logger has handlers, so only
+        # start a listener when ours will actually be installed
+        if not logging.root.handlers:
+            # Callers only enqueue records; a background listener does the
+            # formatting and the console/file I/O off the processing path.
+            # Worker processes log through the same queue (pool_initializer)
+            log_queue = create_log_queue()
+            formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+            handlers = [logging.StreamHandler(), logging.FileHandler('payslip_processor.log')]
+            for handler in handlers:
+                handler.setFormatter(formatter)
+            
+            listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+            listener.start()
+            # Drain anything still queued before the interpreter exits
+            atexit.register(listener.stop)
+            
+            logging.basicConfig(level=log_level, handlers=[make_queue_handler(log_queue)])
         
         # Setup log handler to capture costs
         self._setup_cost_tracking()
@@ -79,6 +153,7 @@ class PayslipProcessor:
     def process_documents(self) -> BatchResult:
         """Process all documents in the incoming folder."""
         start_time = datetime.now()
+        self._batch_started = time.monotonic()
         logger.info("Starting document processing batch")
         
         # Load new documents
@@ -99,29 +174,59 @@ class PayslipProcessor:
         successful_count = 0
         failed_count = 0
         
+        from rich.progress import Progress
+        
         with Progress() as progress:
             task = progress.add_task(
                 "[cyan]Processing documents...", 
                 total=len(new_files)
             )
             
+            # Extract local content first so the AI requests can be submitted together
+            prompt = get_analysis_prompt()
+            results = {}
+            cache_keys = self._load_cached_analyses(new_files, prompt, results, progress, task)
+            pending_files = [(file_path, metadata) for file_path, metadata in new_files
+                             if file_path not in results]
+            prepared = self._prepare_documents(pending_files, results, progress, task)
+            
+            progress.update(task, description="Analyzing documents...")
+            responses, response_keys = self._analyze_prepared(prepared, prompt, progress, task)
+            
+            for (file_path, metadata, _, text_content), response, response_key in zip(
+                    prepared, responses, response_keys):
+                try:
+                    if isinstance(response, BaseException):
+                        raise response
+                    analysis = self.extractor.build_analysis(response, metadata, text_content)
+                    # Only responses that parsed are cached, so bad ones get retried
+                    if response_key is not None:
+                        self.response_cache.put(response_key, response.encode('utf-8'))
+                    # Store before verification and fraud detection modify it in place
+                    if file_path in cache_keys:
+                        self.analysis_cache.put(cache_keys[file_path],
+                                                DOCUMENT_ANALYSIS_ADAPTER.dump_json(analysis))
+                    results[file_path] = analysis
+                except Exception as e:
+                    logger.error(f"Error processing document {file_path}: {e}")
+                    results[file_path] = self.extractor.create_error_analysis(metadata, e)
+            
+            # Unmap image files before they are moved to the archive
+            for _, _, image_data, _ in prepared:
+                if isinstance(image_data, mmap.mmap):
+                    image_data.close()
+            
             for file_path, metadata in new_files:
                 try:
-                    progress.update(task, description=f"Processing {file_path.name}")
-                    
-                    # Extract data
-                    analysis = self.extractor.process_document(file_path, metadata)
-                    analyses.append(analysis)
+                    analyses.append(results[file_path])
                     successful_count += 1
                     
                     # Archive the file
-                    self.loader.archive_file(file_path)
+                    self.loader.archive_file(file_path, start_time)
                     
                 except Exception as e:
                     logger.error(f"Failed to process {file_path}: {e}")
                     failed_count += 1
-                
-                progress.advance(task)
         
         # Apply verification rules
         if analyses:
@@ -144,34 +249,210 @@ class PayslipProcessor:
         logger.info(f"Batch processing complete: {successful_count} successful, {failed_count} failed")
         return batch_result
     
+    def _load_cached_analyses(self, new_files: list, prompt: str, results: dict,
+                              progress: "Progress", task: "TaskID") -> dict:
+        """Fill results with analyses extracted from identical files in earlier runs.
+        
+        Hits skip PDF rendering and the AI request entirely; verification and
+        fraud detection still run, since they depend on the batch and today's
+        date. Returns the cache key for every file, hit or miss.
+        """
+        if not self.analysis_cache:
+            return {}
+        
+        ai = self.config.ai
+        render_settings = (self.config.processing.pdf_dpi, ai.image_max_edge,
+                           ai.image_quality, ai.image_grayscale)
+        keys = {}
+        for file_path, metadata in new_files:
+            file_hash = self.loader.content_hashes.get(file_path)
+            if file_hash is None:
+                continue
+            key = analysis_cache_key(
+                file_hash, prompt, f"{ai.provider}:{ai.model}", render_settings
+            )
+            keys[file_path] = key
+            
+            cached = self.analysis_cache.get(key)
+            if cached is None:
+                continue
+            try:
+                analysis = DOCUMENT_ANALYSIS_ADAPTER.validate_json(cached)
+            except ValueError as e:
+                logger.warning(f"Ignoring unreadable cached analysis for {file_path}: {e}")
+                continue
+            
+            # Keep the extraction results, but describe this run's file
+            cached_metadata = analysis.processing_metadata
+            analysis.processing_metadata = metadata.model_copy(update={
+                'ocr_quality_score': cached_metadata.ocr_quality_score,
+                'pages_processed': cached_metadata.pages_processed
+            })
+            if analysis.raw_text:
+                analysis.text_fingerprint = text_fingerprint(analysis.raw_text)
+            results[file_path] = analysis
+            progress.advance(task)
+        
+        hits = sum(file_path in results for file_path, _ in new_files)
+        if hits:
+            logger.info(f"Reusing {hits} cached document analyses")
+        return keys
+    
+    def _prepare_documents(self, new_files: list, results: dict,
+                           progress: "Progress", task: "TaskID") -> list:
+        """Extract local content for each file, in parallel when workers > 1.
+        
+        Failures are recorded in results as error analyses. PDF rendering is
+        CPU-bound and PDFium isn't thread-safe, so parallel preparation uses
+        processes.
+        """
+        prepared = []
+        workers = self.config.processing.workers
+        
+        if workers <= 1 or len(new_files) <= 1:
+            for file_path, metadata in new_files:
+                progress.update(task, description=f"Preparing {file_path.name}")
+                logger.info(f"Processing document: {file_path}")
+                try:
+                    image_data, text_content, metadata = self.extractor.prepare_document(
+                        file_path, metadata
+                    )
+                    prepared.append((file_path, metadata, image_data, text_content))
+                except Exception as e:
+                    logger.error(f"Error processing document {file_path}: {e}")
+                    results[file_path] = self.extractor.create_error_analysis(metadata, e)
+                    progress.advance(task)
+            return prepared
+        
+        progress.update(task, description=f"Preparing {len(new_files)} documents")
+        with ProcessPoolExecutor(max_workers=min(workers, len(new_files)),
+                                 **pool_initializer()) as executor:
+            futures = [
+                executor.submit(prepare_document_in_worker, self.config, file_path, metadata)
+                for file_path, metadata in new_files
+            ]
+            for (file_path, metadata), future in zip(new_files, futures):
+                logger.info(f"Processing document: {file_path}")
+                try:
+                    image_data, text_content, metadata = future.result()
+                    prepared.append((file_path, metadata, image_data, text_content))
+                except Exception as e:
+                    logger.error(f"Error processing document {file_path}: {e}")
+                    results[file_path] = self.extractor.create_error_analysis(metadata, e)
+                    progress.advance(task)
+        return prepared
+    
+    def _analyze_prepared(self, prepared: list, prompt: str,
+                          progress: "Progress", task: "TaskID") -> Tuple[list, list]:
+        """Analyze prepared documents, reusing cached responses where possible.
+        
+        Returns the responses and, for each fresh one, the key to cache it
+        under once it has parsed (None for cache hits or with caching off).
+        """
+        if not self.response_cache:
+            return (self._request_analyses(prepared, prompt, progress, task),
+                    [None] * len(prepared))
+        
+        ai = self.config.ai
+        # The client re-encodes images with these before upload
+        image_settings = (ai.image_max_edge, ai.image_quality, ai.image_grayscale)
+        model = f"{ai.provider}:{ai.model}"
+        keys = [response_cache_key(image_data, prompt, model, image_settings)
+                for _, _, image_data, _ in prepared]
+        responses = [None] * len(prepared)
+        pending = []
+        for i, key in enumerate(keys):
+            cached = self.response_cache.get(key)
+            if cached is None:
+                pending.append(i)
+            else:
+                responses[i] = cached.decode('utf-8')
+                progress.advance(task)
+        
+        if len(pending) < len(prepared):
+            logger.info(f"Reusing {len(prepared) - len(pending)} cached AI responses")
+        
+        fresh = self._request_analyses([prepared[i] for i in pending], prompt, progress, task)
+        fresh_keys = [None] * len(prepared)
+        for i, response in zip(pending, fresh):
+            if isinstance(response, str):
+                fresh_keys[i] = keys[i]
+            responses[i] = response
+        
+        return responses, fresh_keys
+    
+    def _request_analyses(self, prepared: list, prompt: str,
+                          progress: "Progress", task: "TaskID") -> list:
+        """Send prepared documents to the AI provider using the configured mode."""
+        mode = self.config.ai.mode.lower()
+        
+        if mode == "batch":
+            # Provider batch job: cheaper, but results may take minutes to hours
+            if not prepared:
+                return []
+            batch_id = self.ai_client.submit_batch([
+                (f"doc-{i}", image_data, prompt, text_content or None)
+                for i, (_, _, image_data, text_content) in enumerate(prepared)
+            ])
+            results = self.ai_client.poll_batch(batch_id)
+            progress.advance(task, len(prepared))
+            return [
+                results.get(
+                    f"doc-{i}",
+                    RuntimeError(f"No result returned for doc-{i} in batch {batch_id}")
+                )
+                for i in range(len(prepared))
+            ]
+        
+        if mode == "sync":
+            # Analyze concurrently, bounded by ai.max_concurrency
+            return asyncio.run(self.ai_client.analyze_documents(
+                [(image_data, prompt, text_content or None)
+                 for _, _, image_data, text_content in prepared],
+                on_complete=lambda _: progress.advance(task)
+            ))
+        
+        raise ValueError(f"Unsupported AI mode: {self.config.ai.mode}")
+    
     def _generate_summary(self, analyses: List[DocumentAnalysis]) -> dict:
         """Generate summary statistics for the batch."""
         if not analyses:
             return {}
         
-        # Document type distribution
+        threshold = self.config.fraud_detection.confidence_threshold
+        
+        # Single pass with running totals
         doc_types = {}
+        confidence_sum = 0.0
+        high_confidence_count = 0
+        total_fraud_signals = 0
+        high_risk_docs = 0
+        gross_sum = 0.0
+        gross_count = 0
+        
         for analysis in analyses:
             doc_type = analysis.document_type.value
             doc_types[doc_type] = doc_types.get(doc_type, 0) + 1
+            
+            # Confidence statistics
+            confidence = analysis.overall_confidence
+            confidence_sum += confidence
+            if confidence >= 0.8:
+                high_confidence_count += 1
+            
+            # Fraud detection summary
+            total_fraud_signals += len(analysis.fraud_signals)
+            if confidence < threshold:
+                high_risk_docs += 1
+            
+            # Income statistics
+            gross_pay = analysis.total_gross_pay
+            if gross_pay:
+                gross_sum += gross_pay
+                gross_count += 1
         
-        # Confidence statistics
-        confidences = [analysis.overall_confidence for analysis in analyses]
-        avg_confidence = sum(confidences) / len(confidences)
-        high_confidence_count = sum(1 for c in confidences if c >= 0.8)
-        
-        # Fraud detection summary
-        total_fraud_signals = sum(len(analysis.fraud_signals) for analysis in analyses)
-        high_risk_docs = sum(1 for analysis in analyses 
-                           if analysis.overall_confidence < self.config.fraud_detection.confidence_threshold)
-        
-        # Income statistics
-        total_amounts = []
-        for analysis in analyses:
-            if analysis.total_gross_pay:
-                total_amounts.append(analysis.total_gross_pay)
-        
-        avg_income = sum(total_amounts) / len(total_amounts) if total_amounts else 0
+        avg_confidence = confidence_sum / len(analyses)
+        avg_income = gross_sum / gross_count if gross_count else 0
         
         return {
             "document_types": doc_types,
@@ -187,7 +468,7 @@ class PayslipProcessor:
             },
             "income_stats": {
                 "average_gross_pay": round(avg_income, 2),
-                "total_documents_with_income": len(total_amounts)
+                "total_documents_with_income": gross_count
             }
         }
     
@@ -198,28 +479,21 @@ class PayslipProcessor:
         
         timestamp = batch_result.processing_timestamp.strftime("%Y%m%d_%H%M%S")
         
-        # Save individual document analyses
-        for i, analysis in enumerate(batch_result.documents):
-            filename = f"document_{i+1:03d}_{timestamp}.json"
-            file_path = output_dir / filename
-            
-            with open(file_path, 'w') as f:
-                json.dump(
-                    analysis.model_dump(), 
-                    f, 
-                    indent=self.config.output.json_indent,
-                    default=str
-                )
+        # Serialize straight to JSON bytes, skipping the intermediate dicts
+        indent = self.config.output.json_indent
         
-        # Save batch summary
-        summary_path = output_dir / f"batch_summary_{timestamp}.json"
-        with open(summary_path, 'w') as f:
-            json.dump(
-                batch_result.model_dump(), 
-                f, 
-                indent=self.config.output.json_indent,
-                default=str
-            )
+        # Render every file up front: individual document analyses, then the batch summary
+        payloads = [
+            (output_dir / f"document_{i+1:03d}_{timestamp}.json",
+             DOCUMENT_ANALYSIS_ADAPTER.dump_json(analysis, indent=indent))
+            for i, analysis in enumerate(batch_result.documents)
+        ]
+        payloads.append((output_dir / f"batch_summary_{timestamp}.json",
+                         BATCH_RESULT_ADAPTER.dump_json(batch_result, indent=indent)))
+        
+        # Writes release the GIL, so threads overlap the per-file syscall latency
+        with ThreadPoolExecutor(max_workers=min(WRITE_WORKERS, len(payloads))) as executor:
+            list(executor.map(lambda item: item[0].write_bytes(item[1]), payloads))
         
         logger.info(f"Results saved to {output_dir}")
         return output_dir
@@ -229,6 +503,9 @@ class PayslipProcessor:
         if not self.config.output.console_summary:
             return
         
+        from rich.table import Table
+        from rich.text import Text
+        
         self.console.print("\n[bold cyan]📊 Processing Summary[/bold cyan]")
         
         # Basic stats
@@ -239,7 +516,12 @@ class PayslipProcessor:
         stats_table.add_row("Files Processed", str(batch_result.total_files_processed))
         stats_table.add_row("Successful Extractions", str(batch_result.successful_extractions))
         stats_table.add_row("Failed Extractions", str(batch_result.failed_extractions))
-        stats_table.add_row("Processing Time", str(datetime.now() - batch_result.processing_timestamp))
+        if self._batch_started is not None:
+            elapsed = timedelta(seconds=time.monotonic() - self._batch_started)
+        else:
+            # Summary of a batch this processor didn't run
+            elapsed = datetime.now() - batch_result.processing_timestamp
+        stats_table.add_row("Processing Time", str(elapsed))
         stats_table.add_row("API Cost", f"${self.total_cost:.4f}")
         
         self.console.print(stats_table)
@@ -256,50 +538,24 @@ class PayslipProcessor:
         docs_table.add_column("Confidence", style="magenta")
         docs_table.add_column("Fraud Signals", style="red", width=40)
         
+        # Build every row first, then add them in one tight loop
+        rows = []
         for analysis in batch_result.documents:
-            file_name = Path(analysis.processing_metadata.file_path).name
-            employee_name = analysis.employee.name or "Unknown"
-            gross_pay = f"£{analysis.total_gross_pay:.2f}" if analysis.total_gross_pay else "N/A"
-            confidence = f"{analysis.overall_confidence:.1%}"
-            
-            # Format fraud signals for display
-            if analysis.fraud_signals:
-                # Convert underscored signals to readable format
-                readable_signals = []
-                for signal in analysis.fraud_signals:
-                    readable = signal.replace('_', ' ').title()
-                    readable_signals.append(readable)
-                
-                # Join signals with comma and space, wrap if too long
-                fraud_display = ", ".join(readable_signals)
-                if len(fraud_display) > 60:
-                    # Split long lists across lines
-                    words = fraud_display.split(", ")
-                    lines = []
-                    current_line = ""
-                    for word in words:
-                        if len(current_line + word) > 35:
-                            if current_line:
-                                lines.append(current_line.rstrip(", "))
-                                current_line = word + ", "
-                            else:
-                                lines.append(word)
-                        else:
-                            current_line += word + ", "
-                    if current_line:
-                        lines.append(current_line.rstrip(", "))
-                    fraud_display = "\n".join(lines)
-            else:
-                fraud_display = "Clean"
-            
-            docs_table.add_row(
-                file_name[:20] + "..." if len(file_name) > 23 else file_name,
+            total_gross_pay = analysis.total_gross_pay
+            rows.append((
+                _truncate(os.path.basename(analysis.processing_metadata.file_path), 20),
                 analysis.document_type.value,
-                employee_name[:15] + "..." if len(employee_name) > 18 else employee_name,
-                gross_pay,
-                confidence,
-                fraud_display
-            )
+                _truncate(analysis.employee.name or "Unknown", 15),
+                f"£{total_gross_pay:.2f}" if total_gross_pay else "N/A",
+                f"{analysis.overall_confidence:.1%}",
+                _format_fraud_signals(analysis.fraud_signals)
+            ))
+        
+        # Plain Text cells skip Rich's markup parsing (and can't be misread
+        # as markup when a file or employee name contains brackets)
+        add_row = docs_table.add_row
+        for row in rows:
+            add_row(*map(Text, row))
         
         self.console.print(docs_table)
         
@@ -314,8 +570,8 @@ class PayslipProcessor:
             self.console.print(f"[bold red]High Risk Documents:[/bold red] {fraud_stats['high_risk_documents']}")
             self.console.print(f"[bold red]Total Fraud Signals:[/bold red] {fraud_stats['total_signals']}")
     
-    def run(self) -> BatchResult:
-        """Run the complete processing pipeline."""
+    def run(self, output_path: str = "output") -> BatchResult:
+        """Run the complete processing pipeline, saving results under output_path."""
         try:
             self.console.print("[bold green]🚀 Starting Payslip Intelligence Suite[/bold green]")
             
@@ -327,7 +583,7 @@ class PayslipProcessor:
             
             # Save results
             if batch_result.documents:
-                output_dir = self.save_results(batch_result)
+                output_dir = self.save_results(batch_result, output_path)
                 self.console.print(f"\n[bold cyan]📄 Results saved to:[/bold cyan] {output_dir}")
             
             return batch_result
@@ -0,0 +1,70 @@
+"""MinHash signatures and LSH banding for near-duplicate text detection."""
+
+import zlib
+from collections import defaultdict
+from typing import Iterable, List, Set, Tuple
+
+import numpy as np
+
+NUM_PERM = 128
+SHINGLE_SIZE = 5
+
+# Bands x rows must equal NUM_PERM. 64 bands of 2 rows puts the LSH
+# threshold near Jaccard 0.13; same-template payslips above the 0.85
+# Jaro-Winkler cut-off share roughly 0.4 of their shingles, so candidates
+# err towards recall and the exact check keeps precision.
+LSH_BANDS = 64
+LSH_ROWS = NUM_PERM // LSH_BANDS
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+# Fixed seed so signatures are comparable across runs and processes
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, int(_MERSENNE_PRIME), size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, int(_MERSENNE_PRIME), size=NUM_PERM, dtype=np.uint64)
+del _rng
+
+
+def shingles(text: str, k: int = SHINGLE_SIZE) -> Set[str]:
+    """Return the set of k-character shingles in text."""
+    if len(text) <= k:
+        return {text}
+    return {text[i:i + k] for i in range(len(text) - k + 1)}
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    """Compute a NUM_PERM-value MinHash signature of text's shingles."""
+    hashes = np.fromiter(
+        (zlib.crc32(shingle.encode('utf-8')) for shingle in shingles(text)),
+        dtype=np.uint64
+    )
+    # Universal hashing (a*x + b) mod p, one row per shingle, one column per permutation
+    permuted = (np.outer(hashes, _PERM_A) + _PERM_B) % _MERSENNE_PRIME & _MAX_HASH
+    return permuted.min(axis=0)
+
+
+def text_fingerprint(text: str) -> bytes:
+    """Serialize the MinHash signature of text for storage on an analysis."""
+    return minhash_signature(text).tobytes()
+
+
+def signature_from_fingerprint(fingerprint: bytes) -> np.ndarray:
+    """Rehydrate a signature stored by text_fingerprint without copying."""
+    return np.frombuffer(fingerprint, dtype=np.uint64)
+
+
+def lsh_candidate_pairs(signatures: Iterable[Tuple[int, np.ndarray]]) -> List[Tuple[int, int]]:
+    """Return sorted (i, j) index pairs, i < j, sharing at least one LSH band."""
+    buckets = defaultdict(list)
+    for index, signature in signatures:
+        for band in range(LSH_BANDS):
+            start = band * LSH_ROWS
+            buckets[(band, signature[start:start + LSH_ROWS].tobytes())].append(index)
+
+    pairs = set()
+    for members in buckets.values():
+        for a in range(len(members)):
+            for b in range(a + 1, len(members)):
+                pairs.add((members[a], members[b]))
+    return sorted(pairs)
@@ -1,112 +1,157 @@
 """Document verification and validation service."""
 
 import logging
-from datetime import datetime, timedelta
-from typing import List, Dict, Any
+import math
+import re
+from collections import defaultdict
+from operator import attrgetter
+from datetime import date, datetime
+from typing import List, Dict, Any, Optional, Tuple
 from dateutil.relativedelta import relativedelta
+import numpy as np
 
 from .config import Config
-from .models import DocumentAnalysis, PayFrequency, DocumentType
+from .models import DocumentAnalysis, PayFrequency, DocumentType, Verifications
 
 logger = logging.getLogger(__name__)
 
+# Indicators of a qualified accountant's signature, matched as substrings
+_SIGNATURE_KEYWORDS_RE = re.compile(
+    "|".join(re.escape(keyword) for keyword in [
+        'chartered accountant', 'acca', 'aca', 'fcca', 'fca',
+        'certified accountant', 'qualified accountant'
+    ]),
+    re.IGNORECASE
+)
+
+_pay_date = attrgetter('pay_period.pay_date')
+_amount_gbp = attrgetter('amount_gbp')
+
+# Per-document check results kept by DocumentVerifier, oldest evicted first
+VERIFICATION_CACHE_SIZE = 64
+
+# Expected days between pay dates; monthly periods are checked by calendar month
+_FREQ_DAYS = {
+    PayFrequency.WEEKLY: 7,
+    PayFrequency.FORTNIGHTLY: 14,
+}
+
+
+def _payslips_by_employee(analyses: List[DocumentAnalysis]) -> Dict[str, List[DocumentAnalysis]]:
+    """Group payslips by employee name, in input order.
+    
+    Enum members are singletons, so identity suffices for the type filter.
+    """
+    employee_docs = defaultdict(list)
+    for analysis in analyses:
+        if analysis.document_type is DocumentType.PAYSLIP:
+            employee_docs[analysis.employee.name or "unknown"].append(analysis)
+    return employee_docs
+
 
 class DocumentVerifier:
     """Handles document verification and validation rules."""
     
     def __init__(self, config: Config):
         self.config = config
+        self._settings = config.verification
+        self._verification_cache: Dict[tuple, Tuple[bool, bool, bool]] = {}
+        # Set for the duration of verify_batch so every document shares one cutoff
+        self._recency_cutoff: Optional[date] = None
+        # Last computed cutoff as (today, max_age_months, cutoff)
+        self._cutoff_memo: Optional[Tuple[date, int, date]] = None
+    
+    def recency_cutoff(self) -> date:
+        """Oldest pay date that still passes the recency check today.
+        
+        The month arithmetic runs once per day and max_age_months setting.
+        """
+        today = datetime.now().date()
+        max_age_months = self._settings.max_age_months
+        memo = self._cutoff_memo
+        if memo is not None and memo[0] == today and memo[1] == max_age_months:
+            return memo[2]
+        
+        cutoff = today - relativedelta(months=max_age_months)
+        self._cutoff_memo = (today, max_age_months, cutoff)
+        return cutoff
     
-    def check_document_recency(self, analysis: DocumentAnalysis) -> bool:
+    def check_document_recency(self, analysis: DocumentAnalysis,
+                               cutoff_date: Optional[date] = None) -> bool:
         """Check if document is within the acceptable age limit."""
         if not analysis.pay_period.pay_date:
             return False
         
-        max_age = relativedelta(months=self.config.verification.max_age_months)
-        cutoff_date = datetime.now().date() - max_age
+        if cutoff_date is None:
+            cutoff_date = self._recency_cutoff or self.recency_cutoff()
         
         return analysis.pay_period.pay_date >= cutoff_date
     
     def check_consecutive_periods(self, analyses: List[DocumentAnalysis]) -> Dict[str, bool]:
         """Check if documents represent consecutive pay periods."""
-        # Group by employee
-        employee_docs = {}
-        for analysis in analyses:
-            if analysis.document_type != DocumentType.PAYSLIP:
-                continue
-            
-            emp_key = analysis.employee.name or "unknown"
-            if emp_key not in employee_docs:
-                employee_docs[emp_key] = []
-            employee_docs[emp_key].append(analysis)
-        
-        results = {}
-        for emp_key, docs in employee_docs.items():
-            results[emp_key] = self._check_consecutive_for_employee(docs)
-        
-        return results
+        return self._consecutive_by_employee(_payslips_by_employee(analyses))
+    
+    def _consecutive_by_employee(
+        self, employee_docs: Dict[str, List[DocumentAnalysis]]
+    ) -> Dict[str, bool]:
+        """Consecutive-period results for payslips already grouped by employee."""
+        return {
+            emp_key: self._check_consecutive_for_employee(docs)
+            for emp_key, docs in employee_docs.items()
+        }
     
     def _check_consecutive_for_employee(self, analyses: List[DocumentAnalysis]) -> bool:
         """Check consecutive periods for a single employee."""
-        if len(analyses) < self.config.verification.min_consecutive_periods:
+        if len(analyses) < self._settings.min_consecutive_periods:
             return False
         
         # Sort by pay date
         valid_docs = [a for a in analyses if a.pay_period.pay_date]
-        if len(valid_docs) < self.config.verification.min_consecutive_periods:
+        if len(valid_docs) < self._settings.min_consecutive_periods:
             return False
         
-        valid_docs.sort(key=lambda x: x.pay_period.pay_date)
+        valid_docs.sort(key=_pay_date)
         
         # Check for consistent frequency
         frequency = valid_docs[0].pay_period.frequency
         if not frequency:
             return False
         
-        # Check if all documents have the same frequency
-        if not all(doc.pay_period.frequency == frequency for doc in valid_docs):
+        # Check if all documents have the same frequency (enum members are singletons)
+        if not all(doc.pay_period.frequency is frequency for doc in valid_docs):
             return False
         
+        # Monthly pay dates drift with month length, so compare calendar
+        # months as int64 ordinals: consecutive means exactly one apart
+        if frequency is PayFrequency.MONTHLY:
+            month_ordinals = np.fromiter(
+                (d.year * 12 + d.month - 1 for d in map(_pay_date, valid_docs)),
+                dtype=np.int64, count=len(valid_docs)
+            )
+            return bool(np.all(np.diff(month_ordinals) == 1))
+        
         # Calculate expected interval based on frequency
-        if frequency == PayFrequency.WEEKLY:
-            expected_days = 7
-        elif frequency == PayFrequency.FORTNIGHTLY:
-            expected_days = 14
-        elif frequency == PayFrequency.MONTHLY:
-            expected_days = 30  # Approximate
-        else:
+        expected_days = _FREQ_DAYS.get(frequency)
+        if expected_days is None:
             return False  # Cannot validate annual frequency
         
         # Check if dates are approximately consecutive
         tolerance_days = 3  # Allow some flexibility
         
-        for i in range(1, len(valid_docs)):
-            current_date = valid_docs[i].pay_period.pay_date
-            previous_date = valid_docs[i-1].pay_period.pay_date
-            
-            actual_days = (current_date - previous_date).days
-            
-            if abs(actual_days - expected_days) > tolerance_days:
-                return False
+        # Pay dates as one datetime64 column so the gaps are a single diff
+        pay_dates = np.array([doc.pay_period.pay_date for doc in valid_docs], dtype='datetime64[D]')
+        gaps = np.diff(pay_dates).astype(np.int64)
         
-        return True
+        return bool(np.all(np.abs(gaps - expected_days) <= tolerance_days))
     
     def check_qualified_signature(self, analysis: DocumentAnalysis) -> bool:
         """Check for qualified accountant signature (for self-employed)."""
-        if not self.config.verification.require_qualified_accountant_signature:
+        if not self._settings.require_qualified_accountant_signature:
             return True
         
-        # Check if document contains indicators of qualified signature
-        fraud_signals = [signal.lower() for signal in analysis.fraud_signals]
-        signature_keywords = [
-            'chartered accountant', 'acca', 'aca', 'fcca', 'fca',
-            'certified accountant', 'qualified accountant'
-        ]
-        
-        # Simple check - look for signature keywords in text
+        # Simple check - one case-insensitive scan for signature keywords
         if analysis.raw_text:
-            text_lower = analysis.raw_text.lower()
-            return any(keyword in text_lower for keyword in signature_keywords)
+            return _SIGNATURE_KEYWORDS_RE.search(analysis.raw_text) is not None
         
         return False
     
@@ -115,7 +160,8 @@ class DocumentVerifier:
         if not analysis.income or not analysis.total_gross_pay:
             return False
         
-        calculated_total = sum(item.amount_gbp for item in analysis.income)
+        # fsum is exactly rounded, so long itemisations don't accumulate error
+        calculated_total = math.fsum(map(_amount_gbp, analysis.income))
         declared_total = analysis.total_gross_pay
         
         # Allow for small rounding differences
@@ -123,28 +169,28 @@ class DocumentVerifier:
         return abs(calculated_total - declared_total) <= tolerance
     
     def validate_income_consistency(self, analyses: List[DocumentAnalysis]) -> Dict[str, Any]:
-        """Analyze income consistency across multiple documents."""
-        employee_incomes = {}
-        
-        # Group by employee
-        for analysis in analyses:
-            if analysis.document_type != DocumentType.PAYSLIP:
-                continue
-            
-            emp_key = analysis.employee.name or "unknown"
-            if emp_key not in employee_incomes:
-                employee_incomes[emp_key] = []
-            
-            if analysis.total_gross_pay:
-                employee_incomes[emp_key].append({
-                    'amount': analysis.total_gross_pay,
-                    'date': analysis.pay_period.pay_date,
-                    'frequency': analysis.pay_period.frequency
-                })
+        """Analyze income consistency across multiple documents.
         
+        A payslip is an outlier when its gross pay deviates from the
+        employee's mean by more than verification.income_deviation_threshold.
+        """
+        return self._income_consistency_by_employee(_payslips_by_employee(analyses))
+    
+    def _income_consistency_by_employee(
+        self, employee_docs: Dict[str, List[DocumentAnalysis]]
+    ) -> Dict[str, Any]:
+        """Income consistency results for payslips already grouped by employee.
+        
+        Gross pay is pulled into one float64 column per employee; the
+        payslips themselves are only revisited for flagged outliers.
+        """
+        threshold = self._settings.income_deviation_threshold
         results = {}
-        for emp_key, incomes in employee_incomes.items():
-            if len(incomes) < 2:
+        for emp_key, docs in employee_docs.items():
+            # Employees without pay still get an entry
+            paid = [analysis for analysis in docs if analysis.total_gross_pay]
+            
+            if len(paid) < 2:
                 results[emp_key] = {
                     'consistent': True,
                     'variance': 0.0,
@@ -152,21 +198,22 @@ class DocumentVerifier:
                 }
                 continue
             
-            amounts = [inc['amount'] for inc in incomes]
-            mean_income = sum(amounts) / len(amounts)
-            variance = sum((x - mean_income) ** 2 for x in amounts) / len(amounts)
+            amounts = np.fromiter((analysis.total_gross_pay for analysis in paid),
+                                  dtype=np.float64, count=len(paid))
+            mean_income = float(amounts.mean())
+            variance = float(amounts.var())
             
-            # Identify outliers (more than 20% deviation from mean)
-            outliers = []
-            for i, amount in enumerate(amounts):
-                deviation = abs(amount - mean_income) / mean_income
-                if deviation > 0.20:  # 20% threshold
-                    outliers.append({
-                        'index': i,
-                        'amount': amount,
-                        'deviation': deviation,
-                        'date': incomes[i]['date']
-                    })
+            # Identify outliers by relative deviation from the mean
+            deviations = np.abs(amounts - mean_income) / mean_income
+            outliers = [
+                {
+                    'index': int(i),
+                    'amount': paid[i].total_gross_pay,
+                    'deviation': float(deviations[i]),
+                    'date': paid[i].pay_period.pay_date
+                }
+                for i in np.flatnonzero(deviations > threshold)
+            ]
             
             results[emp_key] = {
                 'consistent': len(outliers) == 0,
@@ -177,61 +224,97 @@ class DocumentVerifier:
         
         return results
     
+    def _document_checks(
+        self, analysis: DocumentAnalysis
+    ) -> Tuple[bool, Optional[bool], Optional[bool]]:
+        """Recency, total consistency and signature results, cached by content.
+        
+        With early_exit_on_fraud, checks after the first failure are skipped and reported as None.
+        """
+        cutoff_date = self._recency_cutoff or self.recency_cutoff()
+        early_exit = self._settings.early_exit_on_fraud
+        key = (
+            cutoff_date,
+            self._settings.require_qualified_accountant_signature,
+            early_exit,
+            analysis.pay_period.pay_date,
+            tuple(map(_amount_gbp, analysis.income)),
+            analysis.total_gross_pay,
+            analysis.raw_text
+        )
+        results = self._verification_cache.get(key)
+        if results is None:
+            recency_pass = self.check_document_recency(analysis, cutoff_date)
+            total_consistency_pass = qualified_signature_pass = None
+            if recency_pass or not early_exit:
+                total_consistency_pass = self.check_total_consistency(analysis)
+                if total_consistency_pass or not early_exit:
+                    qualified_signature_pass = self.check_qualified_signature(analysis)
+            results = (recency_pass, total_consistency_pass, qualified_signature_pass)
+            if len(self._verification_cache) >= VERIFICATION_CACHE_SIZE:
+                del self._verification_cache[next(iter(self._verification_cache))]
+            self._verification_cache[key] = results
+        return results
+    
     def verify_document(self, analysis: DocumentAnalysis) -> DocumentAnalysis:
         """Apply verification rules to a single document."""
-        # Update verification flags
-        analysis.verifications.recency_pass = self.check_document_recency(analysis)
-        analysis.verifications.total_consistency_pass = self.check_total_consistency(analysis)
-        analysis.verifications.qualified_signature_pass = self.check_qualified_signature(analysis)
-        
-        # Add fraud signals based on verification failures
-        if not analysis.verifications.total_consistency_pass:
+        checks = self._document_checks(analysis)
+        recency_pass, total_consistency_pass, qualified_signature_pass = checks
+        
+        # Update verification flags; the checks return plain bools, so skip validation
+        verifications = analysis.verifications
+        analysis.verifications = Verifications.model_construct(
+            recency_pass=recency_pass,
+            consecutive_pass=verifications.consecutive_pass,
+            qualified_signature_pass=qualified_signature_pass,
+            total_consistency_pass=total_consistency_pass,
+            date_format_pass=verifications.date_format_pass
+        )
+        
+        # Add fraud signals based on verification failures; checks skipped
+        # by early exit are None and neither flag nor penalise the document
+        if total_consistency_pass is False:
             analysis.fraud_signals.append("income_total_mismatch")
         
-        if not analysis.verifications.recency_pass:
+        if not recency_pass:
             analysis.fraud_signals.append("document_too_old")
         
-        # Adjust overall confidence based on verifications
-        confidence_factors = [
-            analysis.verifications.recency_pass,
-            analysis.verifications.total_consistency_pass,
-            analysis.verifications.date_format_pass
-        ]
-        
-        if analysis.verifications.qualified_signature_pass is not None:
-            confidence_factors.append(analysis.verifications.qualified_signature_pass)
-        
         # Reduce confidence for each failed verification
-        failed_checks = sum(1 for factor in confidence_factors if not factor)
+        failed_checks = ((not recency_pass) + (total_consistency_pass is False)
+                         + (not verifications.date_format_pass)
+                         + (qualified_signature_pass is False))
         confidence_penalty = failed_checks * 0.15  # 15% penalty per failed check
         
-        analysis.overall_confidence = max(0.0, 
-            analysis.overall_confidence - confidence_penalty)
+        analysis.overall_confidence = max(0.0, analysis.overall_confidence - confidence_penalty)
         
         return analysis
     
     def verify_batch(self, analyses: List[DocumentAnalysis]) -> List[DocumentAnalysis]:
         """Apply verification rules to a batch of documents."""
-        # First, verify individual documents
-        verified_analyses = [self.verify_document(analysis) for analysis in analyses]
+        # First, verify individual documents against one shared recency cutoff
+        self._recency_cutoff = self.recency_cutoff()
+        try:
+            verified_analyses = [self.verify_document(analysis) for analysis in analyses]
+        finally:
+            self._recency_cutoff = None
+        
+        # Group payslips by employee once for both cross-document checks
+        employee_docs = _payslips_by_employee(verified_analyses)
+        consecutive_results = self._consecutive_by_employee(employee_docs)
+        consistency_results = self._income_consistency_by_employee(employee_docs)
         
-        # Check consecutive periods
-        consecutive_results = self.check_consecutive_periods(verified_analyses)
-        
-        # Update consecutive verification flags
         for analysis in verified_analyses:
             emp_key = analysis.employee.name or "unknown"
-            analysis.verifications.consecutive_pass = consecutive_results.get(emp_key, False)
+            
+            # Update consecutive verification flags
+            analysis.verifications = analysis.verifications.model_copy(
+                update={'consecutive_pass': consecutive_results.get(emp_key, False)}
+            )
             
             if not analysis.verifications.consecutive_pass:
                 analysis.fraud_signals.append("non_consecutive_periods")
-        
-        # Validate income consistency
-        consistency_results = self.validate_income_consistency(verified_analyses)
-        
-        # Add consistency warnings to fraud signals
-        for analysis in verified_analyses:
-            emp_key = analysis.employee.name or "unknown"
+            
+            # Add consistency warnings to fraud signals
             consistency = consistency_results.get(emp_key, {})
             
             if not consistency.get('consistent', True):
@@ -0,0 +1,46 @@
+"""Forwarding of log records from worker processes to the parent's handlers."""
+
+import logging
+import multiprocessing
+from logging.handlers import QueueHandler
+from typing import Any, Dict, Optional
+
+# Queue the parent's QueueListener drains; None until queue-based logging is installed
+_log_queue: Optional["multiprocessing.Queue"] = None
+
+
+def create_log_queue() -> "multiprocessing.Queue":
+    """Create the log record queue, reachable from worker processes too."""
+    global _log_queue
+    _log_queue = multiprocessing.Queue()
+    return _log_queue
+
+
+def make_queue_handler(log_queue: "multiprocessing.Queue") -> QueueHandler:
+    """Handler that only enqueues records; the listener's handlers format them."""
+    handler = QueueHandler(log_queue)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    return handler
+
+
+def _init_worker_logging(log_queue: "multiprocessing.Queue", level: int) -> None:
+    """Process-pool initializer: route every record to the parent's queue."""
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(make_queue_handler(log_queue))
+    root.setLevel(level)
+
+
+def pool_initializer() -> Dict[str, Any]:
+    """ProcessPoolExecutor keyword arguments that forward worker logs to the parent.
+
+    Empty when the parent hasn't installed queue-based logging, e.g. when
+    a library caller configured its own handlers.
+    """
+    if _log_queue is None:
+        return {}
+    return {
+        'initializer': _init_worker_logging,
+        'initargs': (_log_queue, logging.getLogger().level),
+    }
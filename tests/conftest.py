@@ -1,8 +1,8 @@
 """Test configuration and shared fixtures."""
 
+import pickle
 import pytest
-import tempfile
-import shutil
+import toml
 from pathlib import Path
 from datetime import datetime, date
 from unittest.mock import Mock
@@ -15,11 +15,67 @@ from services.models import (
 
 
 @pytest.fixture
-def temp_dir():
-    """Create a temporary directory for tests."""
-    temp_dir = tempfile.mkdtemp()
-    yield Path(temp_dir)
-    shutil.rmtree(temp_dir)
+def temp_dir(tmp_path):
+    """Create a temporary directory for tests.
+    
+    pytest's tmp_path is removed in bulk by its own retention policy
+    rather than with an rmtree after every test.
+    """
+    return tmp_path
+
+
+@pytest.fixture(scope="session")
+def today():
+    """The date the test session started, so every test agrees on "today"."""
+    return date.today()
+
+
+@pytest.fixture(scope="session")
+def sample_config_path(tmp_path_factory):
+    """Write a complete TOML config, and the API key it points at, once per session.
+    
+    Config.load caches parsed files until they change, so every test
+    loading this path after the first gets the parsed Config for free.
+    Tests must not modify the file or the loaded Config.
+    """
+    config_dir = tmp_path_factory.mktemp("config")
+    key_file = config_dir / "api_key"
+    key_file.write_text("test-api-key-12345")
+    
+    config_data = {
+        "ai": {
+            "provider": "openai",
+            "model": "gpt-4o-mini",
+            "api_key_file": str(key_file)
+        },
+        "processing": {
+            "docs_folder": "test_docs",
+            "archive_folder": "test_archive",
+            "max_file_size_mb": 10,
+            "supported_formats": ["pdf", "png"]
+        },
+        "verification": {
+            "max_age_months": 6,
+            "min_consecutive_periods": 3,
+            "require_qualified_accountant_signature": False
+        },
+        "fraud_detection": {
+            "confidence_threshold": 0.7,
+            "font_consistency_check": True,
+            "total_validation": True,
+            "ocr_quality_threshold": 0.8
+        },
+        "output": {
+            "log_level": "INFO",
+            "json_indent": 2,
+            "console_summary": True
+        }
+    }
+    
+    config_path = config_dir / "test_config.toml"
+    with open(config_path, 'w') as f:
+        toml.dump(config_data, f)
+    return config_path
 
 
 @pytest.fixture
@@ -56,10 +112,14 @@ def sample_config():
     )
 
 
+# Fixture data is known-good, so models are built with model_construct to
+# skip validation; tests of validation itself construct models directly.
+
+
 @pytest.fixture
 def sample_processing_metadata(temp_dir):
     """Create sample processing metadata."""
-    return ProcessingMetadata(
+    return ProcessingMetadata.model_construct(
         file_path=str(temp_dir / "test_document.pdf"),
         file_size_bytes=1024,
         processing_timestamp=datetime.now(),
@@ -71,7 +131,7 @@ def sample_processing_metadata(temp_dir):
 @pytest.fixture
 def sample_employee():
     """Create sample employee data."""
-    return Employee(
+    return Employee.model_construct(
         name="John Smith",
         ni_number="AB123456C",
         employee_id="EMP001",
@@ -82,7 +142,7 @@ def sample_employee():
 @pytest.fixture
 def sample_employer():
     """Create sample employer data."""
-    return Employer(
+    return Employer.model_construct(
         name="Acme Corporation Ltd",
         address="123 Business Street, London",
         company_registration="12345678",
@@ -93,7 +153,7 @@ def sample_employer():
 @pytest.fixture
 def sample_pay_period():
     """Create sample pay period data."""
-    return PayPeriod(
+    return PayPeriod.model_construct(
         start_date=date(2024, 1, 1),
         end_date=date(2024, 1, 31),
         pay_date=date(2024, 2, 5),
@@ -106,13 +166,13 @@ def sample_pay_period():
 def sample_income():
     """Create sample income data."""
     return [
-        Income(
+        Income.model_construct(
             type=IncomeType.SALARY,
             amount_gbp=3000.00,
             description="Basic Salary",
             confidence=0.95
         ),
-        Income(
+        Income.model_construct(
             type=IncomeType.BONUS,
             amount_gbp=500.00,
             description="Performance Bonus",
@@ -124,7 +184,7 @@ def sample_income():
 @pytest.fixture
 def sample_verifications():
     """Create sample verification data."""
-    return Verifications(
+    return Verifications.model_construct(
         recency_pass=True,
         consecutive_pass=True,
         qualified_signature_pass=None,
@@ -138,7 +198,7 @@ def sample_document_analysis(sample_processing_metadata, sample_employee,
                            sample_employer, sample_pay_period, sample_income,
                            sample_verifications):
     """Create a complete sample document analysis."""
-    return DocumentAnalysis(
+    return DocumentAnalysis.model_construct(
         document_type=DocumentType.PAYSLIP,
         employee=sample_employee,
         employer=sample_employer,
@@ -154,6 +214,32 @@ def sample_document_analysis(sample_processing_metadata, sample_employee,
     )
 
 
+@pytest.fixture
+def make_analysis_copy(sample_document_analysis):
+    """Return a factory for independent deep copies of the sample analysis.
+    
+    The analysis is pickled once; each call only unpickles, which is
+    cheaper than a deep model_copy and shares no nested models.
+    """
+    blob = pickle.dumps(sample_document_analysis)
+    return lambda: pickle.loads(blob)
+
+
+@pytest.fixture
+def monthly_payslip(make_analysis_copy):
+    """Return a builder of sample payslips for John Smith, paid monthly on a given date."""
+    def make(pay_date, total_gross_pay=None):
+        analysis = make_analysis_copy()
+        analysis.employee.name = "John Smith"
+        analysis.pay_period.pay_date = pay_date
+        analysis.pay_period.frequency = PayFrequency.MONTHLY
+        if total_gross_pay is not None:
+            analysis.total_gross_pay = total_gross_pay
+        return analysis
+    
+    return make
+
+
 @pytest.fixture
 def mock_ai_client():
     """Create a mock AI client."""
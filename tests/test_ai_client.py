@@ -0,0 +1,178 @@
+"""Tests for AI client functionality."""
+
+import asyncio
+import io
+import pytest
+from typing import Optional
+from unittest.mock import patch
+from PIL import Image
+
+from services.ai_client import AIClient, AnthropicClient, OpenAIClient
+
+
+class StubAIClient(AIClient):
+    """AI client that records concurrency instead of calling a provider."""
+
+    def __init__(self, config, fail_on: Optional[bytes] = None):
+        self.config = config
+        self.fail_on = fail_on
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _prepare_request(self, image_data, prompt, text_content=None):
+        return image_data
+
+    def _send(self, messages):
+        return messages.decode()
+
+    async def _send_async(self, messages):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if messages == self.fail_on:
+            raise RuntimeError("provider error")
+        return messages.decode()
+
+    def submit_batch(self, items):
+        self.batch = {custom_id: image_data.decode() for custom_id, image_data, _, _ in items}
+        self.polls_remaining = 2
+        return "batch_1"
+
+    def _fetch_batch_results(self, batch_id):
+        if self.polls_remaining:
+            self.polls_remaining -= 1
+            return None
+        return self.batch
+
+
+def test_analyze_documents_preserves_order(sample_config):
+    """Test batch results are returned in submission order."""
+    client = StubAIClient(sample_config)
+    batch = [(f"doc{i}".encode(), "prompt", None) for i in range(5)]
+
+    results = asyncio.run(client.analyze_documents(batch))
+
+    assert results == [f"doc{i}" for i in range(5)]
+
+
+def test_analyze_documents_respects_concurrency_limit(sample_config):
+    """Test no more than max_concurrency requests are in flight."""
+    sample_config.ai.max_concurrency = 2
+    client = StubAIClient(sample_config)
+    batch = [(f"doc{i}".encode(), "prompt", None) for i in range(6)]
+
+    completed = []
+    asyncio.run(client.analyze_documents(batch, on_complete=completed.append))
+
+    assert client.max_in_flight == 2
+    assert sorted(completed) == list(range(6))
+
+
+def test_analyze_documents_returns_exceptions(sample_config):
+    """Test a failed request does not cancel the rest of the batch."""
+    client = StubAIClient(sample_config, fail_on=b"doc1")
+    batch = [(f"doc{i}".encode(), "prompt", None) for i in range(3)]
+
+    results = asyncio.run(client.analyze_documents(batch))
+
+    assert results[0] == "doc0"
+    assert isinstance(results[1], RuntimeError)
+    assert results[2] == "doc2"
+
+
+def test_analyze_documents_opens_client_per_event_loop(sample_config):
+    """Test each asyncio.run gets its own async SDK client, closed afterwards."""
+    
+    class FakeAsyncClient:
+        def __init__(self):
+            self.closed = False
+        
+        async def close(self):
+            self.closed = True
+    
+    opened = []
+    client = StubAIClient(sample_config)
+    client._create_async_client = lambda: opened.append(FakeAsyncClient()) or opened[-1]
+    batch = [(b"doc0", "prompt", None)]
+    
+    asyncio.run(client.analyze_documents(batch))
+    asyncio.run(client.analyze_documents(batch))
+    
+    assert len(opened) == 2
+    assert all(aclient.closed for aclient in opened)
+    assert client.aclient is None
+
+
+def test_poll_batch_waits_for_completion(sample_config):
+    """Test batch polling backs off until results are available."""
+    client = StubAIClient(sample_config)
+    batch_id = client.submit_batch([(f"doc-{i}", f"doc{i}".encode(), "prompt", None) for i in range(3)])
+
+    with patch('services.ai_client.time.sleep') as mock_sleep:
+        results = client.poll_batch(batch_id, initial_delay=1.0, max_delay=1.5)
+
+    assert results == {"doc-0": "doc0", "doc-1": "doc1", "doc-2": "doc2"}
+    assert [c.args[0] for c in mock_sleep.call_args_list] == [1.0, 1.5]
+
+
+def test_prepare_image_downscales_to_jpeg(sample_config):
+    """Test large images are re-encoded as JPEG within the max edge."""
+    client = StubAIClient(sample_config)
+    png = io.BytesIO()
+    Image.new('RGB', (3200, 2400), 'white').save(png, 'PNG')
+
+    prepared = Image.open(io.BytesIO(client._prepare_image(png.getvalue())))
+
+    assert prepared.format == 'JPEG'
+    assert max(prepared.size) == sample_config.ai.image_max_edge
+
+
+def test_prepare_image_grayscale(sample_config):
+    """Test colour images are re-encoded single-channel when grayscale is enabled."""
+    sample_config.ai.image_grayscale = True
+    client = StubAIClient(sample_config)
+    jpeg = io.BytesIO()
+    Image.new('RGB', (800, 600), 'white').save(jpeg, 'JPEG')
+
+    prepared = Image.open(io.BytesIO(client._prepare_image(jpeg.getvalue())))
+
+    assert prepared.format == 'JPEG'
+    assert prepared.mode == 'L'
+    assert prepared.size == (800, 600)
+
+
+def test_prepare_image_applies_exif_orientation(sample_config):
+    """Test rotated phone photos are uploaded upright."""
+    client = StubAIClient(sample_config)
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Rotate 90 degrees clockwise to display
+    jpeg = io.BytesIO()
+    Image.new('RGB', (800, 600), 'white').save(jpeg, 'JPEG', exif=exif)
+    
+    prepared = Image.open(io.BytesIO(client._prepare_image(jpeg.getvalue())))
+    
+    assert prepared.size == (600, 800)
+    assert prepared.getexif().get(0x0112, 1) == 1
+
+
+def test_prepare_image_passes_through_invalid_data(sample_config):
+    """Test undecodable data is sent unchanged."""
+    client = StubAIClient(sample_config)
+    assert client._prepare_image(b"not an image") == b"not an image"
+
+
+def test_message_layout_with_extracted_text(sample_config):
+    """Test extracted text sits between the prompt and the image for both providers."""
+    openai_client = OpenAIClient.__new__(OpenAIClient)
+    openai_client.config = sample_config
+    anthropic_client = AnthropicClient.__new__(AnthropicClient)
+    anthropic_client.config = sample_config
+
+    content = openai_client._prepare_request(b"img", "prompt", "payslip text")[0]["content"]
+    assert [part["type"] for part in content] == ["text", "text", "image_url"]
+    assert content[1]["text"] == "Extracted text content:\npayslip text"
+
+    content = anthropic_client._build_content(b"img", "prompt", None)
+    assert [part["type"] for part in content] == ["image", "text"]
+    assert content[1]["text"] == "prompt"
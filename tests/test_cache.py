@@ -0,0 +1,44 @@
+"""Tests for the content-addressed cache."""
+
+import pytest
+
+from services.cache import ContentCache, analysis_cache_key, response_cache_key
+
+
+def test_response_cache_key_covers_all_inputs():
+    """Test the key changes with image, prompt, provider, model or upload settings."""
+    settings = (1600, 80, False)
+    key = response_cache_key(b"image", "prompt", "openai:gpt-4o-mini", settings)
+
+    assert key == response_cache_key(b"image", "prompt", "openai:gpt-4o-mini", settings)
+    assert key != response_cache_key(b"other", "prompt", "openai:gpt-4o-mini", settings)
+    assert key != response_cache_key(b"image", "new prompt", "openai:gpt-4o-mini", settings)
+    assert key != response_cache_key(b"image", "prompt", "openai:gpt-4o", settings)
+    assert key != response_cache_key(b"image", "prompt", "anthropic:gpt-4o-mini", settings)
+    assert key != response_cache_key(b"image", "prompt", "openai:gpt-4o-mini", (1024, 80, False))
+    assert key != response_cache_key(b"image", "prompt", "openai:gpt-4o-mini", (1600, 80, True))
+
+
+def test_analysis_cache_key_covers_all_inputs():
+    """Test the key changes with file content, prompt, model or render settings."""
+    key = analysis_cache_key("abc123", "prompt", "openai:gpt-4o-mini", (200, 1600, 80))
+
+    assert key.startswith("abc123-")
+    assert key == analysis_cache_key("abc123", "prompt", "openai:gpt-4o-mini", (200, 1600, 80))
+    assert key != analysis_cache_key("def456", "prompt", "openai:gpt-4o-mini", (200, 1600, 80))
+    assert key != analysis_cache_key("abc123", "new prompt", "openai:gpt-4o-mini", (200, 1600, 80))
+    assert key != analysis_cache_key("abc123", "prompt", "openai:gpt-4o", (200, 1600, 80))
+    assert key != analysis_cache_key("abc123", "prompt", "openai:gpt-4o-mini", (300, 1600, 80))
+
+
+def test_content_cache_round_trip(temp_dir):
+    """Test values can be stored and read back."""
+    cache = ContentCache(str(temp_dir / "cache"))
+    key = response_cache_key(b"image", "prompt", "openai:gpt-4o-mini", (1600, 80, False))
+
+    assert cache.get(key) is None
+
+    cache.put(key, b'{"document_type": "payslip"}')
+
+    assert cache.get(key) == b'{"document_type": "payslip"}'
+    assert not list((temp_dir / "cache").rglob("*.tmp"))
@@ -2,49 +2,15 @@
 
 import pytest
 import tempfile
-import toml
 from pathlib import Path
+from unittest.mock import patch
 
 from services.config import Config
 
 
-def test_load_config(temp_dir):
+def test_load_config(sample_config_path):
     """Test loading configuration from TOML file."""
-    config_data = {
-        "ai": {
-            "provider": "openai",
-            "model": "gpt-4o-mini",
-            "api_key_file": ".secrets/test_key"
-        },
-        "processing": {
-            "docs_folder": "test_docs",
-            "archive_folder": "test_archive",
-            "max_file_size_mb": 10,
-            "supported_formats": ["pdf", "png"]
-        },
-        "verification": {
-            "max_age_months": 6,
-            "min_consecutive_periods": 3,
-            "require_qualified_accountant_signature": False
-        },
-        "fraud_detection": {
-            "confidence_threshold": 0.7,
-            "font_consistency_check": True,
-            "total_validation": True,
-            "ocr_quality_threshold": 0.8
-        },
-        "output": {
-            "log_level": "INFO",
-            "json_indent": 2,
-            "console_summary": True
-        }
-    }
-    
-    config_path = temp_dir / "test_config.toml"
-    with open(config_path, 'w') as f:
-        toml.dump(config_data, f)
-    
-    config = Config.load(str(config_path))
+    config = Config.load(str(sample_config_path))
     
     assert config.ai.provider == "openai"
     assert config.ai.model == "gpt-4o-mini"
@@ -54,54 +20,38 @@ def test_load_config(temp_dir):
     assert config.output.log_level == "INFO"
 
 
+def test_load_config_cached_until_modified(temp_dir):
+    """Test Config.load reuses the parsed config until the file changes."""
+    config_path = temp_dir / "test_config.toml"
+    config_path.write_text((Path(__file__).parent.parent / "config.toml").read_text())
+    
+    first = Config.load(str(config_path))
+    with patch("services.config.tomllib.load") as mock_load:
+        second = Config.load(str(config_path))
+    mock_load.assert_not_called()
+    assert second == first
+    
+    # Callers get independent copies of the cached config
+    second.processing.max_file_size_mb = 1
+    assert Config.load(str(config_path)).processing.max_file_size_mb == 50
+    
+    config_path.write_text(config_path.read_text().replace("max_file_size_mb = 50", "max_file_size_mb = 10"))
+    
+    reloaded = Config.load(str(config_path))
+    assert reloaded is not first
+    assert reloaded.processing.max_file_size_mb == 10
+
+
 def test_load_nonexistent_config():
     """Test loading non-existent configuration file."""
     with pytest.raises(FileNotFoundError):
         Config.load("nonexistent.toml")
 
 
-def test_get_api_key(temp_dir):
+def test_get_api_key(sample_config_path):
     """Test API key loading."""
-    api_key = "test-api-key-12345"
-    key_file = temp_dir / "api_key"
-    key_file.write_text(api_key)
-    
-    config_data = {
-        "ai": {
-            "provider": "openai",
-            "model": "gpt-4o-mini",
-            "api_key_file": str(key_file)
-        },
-        "processing": {
-            "docs_folder": "test_docs",
-            "archive_folder": "test_archive",
-            "max_file_size_mb": 10,
-            "supported_formats": ["pdf"]
-        },
-        "verification": {
-            "max_age_months": 6,
-            "min_consecutive_periods": 3,
-            "require_qualified_accountant_signature": False
-        },
-        "fraud_detection": {
-            "confidence_threshold": 0.7,
-            "font_consistency_check": True,
-            "total_validation": True,
-            "ocr_quality_threshold": 0.8
-        },
-        "output": {
-            "log_level": "INFO",
-            "json_indent": 2,
-            "console_summary": True
-        }
-    }
-    
-    config_path = temp_dir / "test_config.toml"
-    with open(config_path, 'w') as f:
-        toml.dump(config_data, f)
-    
-    config = Config.load(str(config_path))
-    assert config.get_api_key() == api_key
+    config = Config.load(str(sample_config_path))
+    assert config.get_api_key() == "test-api-key-12345"
 
 
 def test_get_nonexistent_api_key(sample_config):
@@ -2,10 +2,10 @@
 
 import pytest
 import json
-from unittest.mock import Mock, patch
+from unittest.mock import MagicMock, Mock, patch
 from pathlib import Path
 
-from services.extractor import DocumentExtractor
+from services.extractor import DocumentExtractor, prepare_document_in_worker
 from services.models import DocumentType
 
 
@@ -74,6 +74,28 @@ That's the result."""
     assert parsed["overall_confidence"] == 0.85
 
 
+def test_parse_ai_response_with_surrounding_prose(sample_config, mock_ai_client):
+    """Test the leading object is parsed when prose after it has braces."""
+    extractor = DocumentExtractor(sample_config, mock_ai_client)
+    
+    response = """Here is the analysis: {"document_type": "payslip", "employee": {"name": "A"}}
+Let me know if you need anything else :}"""
+    
+    parsed = extractor.parse_ai_response(response)
+    
+    assert parsed == {"document_type": "payslip", "employee": {"name": "A"}}
+
+
+def test_parse_ai_response_truncated_json(sample_config, mock_ai_client):
+    """Test a truncated object fails rather than yielding a nested one."""
+    extractor = DocumentExtractor(sample_config, mock_ai_client)
+    
+    response = '{"document_type": "payslip", "employee": {"name": "A"}, "employer": {"na'
+    
+    with pytest.raises(ValueError):
+        extractor.parse_ai_response(response)
+
+
 def test_parse_ai_response_invalid_json(sample_config, mock_ai_client):
     """Test parsing invalid AI response."""
     extractor = DocumentExtractor(sample_config, mock_ai_client)
@@ -134,20 +156,34 @@ def test_create_document_analysis(sample_config, mock_ai_client, sample_processi
     assert analysis.income[0].amount_gbp == 3000.00
     assert "test_signal" in analysis.fraud_signals
     assert analysis.overall_confidence == 0.92
+    assert analysis.text_fingerprint is not None
+    assert "text_fingerprint" not in analysis.model_dump()
+
+
+def test_create_document_analysis_unknown_type(sample_config, mock_ai_client,
+                                               sample_processing_metadata):
+    """Test an unrecognised document type is rejected rather than relabelled."""
+    extractor = DocumentExtractor(sample_config, mock_ai_client)
+    
+    with pytest.raises(ValueError, match="not a valid DocumentType"):
+        extractor.create_document_analysis(
+            {"document_type": "invoice"}, sample_processing_metadata, "Invoice text"
+        )
 
 
 def test_extract_text_from_pdf(sample_config, mock_ai_client, sample_pdf_file):
     """Test PDF text extraction."""
     extractor = DocumentExtractor(sample_config, mock_ai_client)
     
-    # Mock PyPDF2 functionality
-    with patch('PyPDF2.PdfReader') as mock_reader:
+    # Mock PDFium functionality
+    with patch('pypdfium2.PdfDocument') as mock_document:
         mock_page = Mock()
-        mock_page.extract_text.return_value = "Sample PDF text content"
+        mock_page.get_textpage.return_value.get_text_range.return_value = "Sample PDF text content"
         
-        mock_pdf = Mock()
-        mock_pdf.pages = [mock_page]
-        mock_reader.return_value = mock_pdf
+        mock_pdf = MagicMock()
+        mock_pdf.__len__.return_value = 1
+        mock_pdf.__getitem__.return_value = mock_page
+        mock_document.return_value = mock_pdf
         
         text, pages = extractor.extract_text_from_pdf(sample_pdf_file)
         
@@ -155,27 +191,84 @@ def test_extract_text_from_pdf(sample_config, mock_ai_client, sample_pdf_file):
         assert pages == 1
 
 
+def test_extract_pdf_text_and_image(sample_config, mock_ai_client, temp_dir):
+    """Test one pass over a PDF yields page count, text and a first-page image."""
+    import pypdfium2 as pdfium
+    
+    pdf = pdfium.PdfDocument.new()
+    pdf.new_page(200, 300)
+    pdf.new_page(200, 300)
+    pdf_path = temp_dir / "two_pages.pdf"
+    pdf.save(str(pdf_path))
+    pdf.close()
+    
+    extractor = DocumentExtractor(sample_config, mock_ai_client)
+    text, pages, image_data = extractor._extract_pdf(pdf_path)
+    
+    assert pages == 2
+    assert "--- Page 2 ---" in text
+    assert image_data.startswith(b"\xff\xd8")  # JPEG
+
+
+def test_convert_pdf_to_image_caps_long_edge(sample_config, mock_ai_client, temp_dir):
+    """Test large pages render no bigger than the AI upload limit."""
+    import pypdfium2 as pdfium
+    from PIL import Image
+    import io
+    
+    pdf = pdfium.PdfDocument.new()
+    pdf.new_page(1190, 1684)  # A2 in points
+    pdf_path = temp_dir / "large.pdf"
+    pdf.save(str(pdf_path))
+    pdf.close()
+    
+    extractor = DocumentExtractor(sample_config, mock_ai_client)
+    image = Image.open(io.BytesIO(extractor.convert_pdf_to_image(pdf_path)))
+    
+    assert image.format == 'JPEG'
+    assert max(image.size) <= sample_config.ai.image_max_edge
+
+
 def test_load_image_file(sample_config, mock_ai_client, sample_image_file):
     """Test image file loading."""
     extractor = DocumentExtractor(sample_config, mock_ai_client)
     
     image_data = extractor.load_image_file(sample_image_file)
     
-    assert isinstance(image_data, bytes)
+    assert image_data[:] == sample_image_file.read_bytes()
     assert len(image_data) > 0
+    image_data.close()
+
 
+def test_prepare_document_in_worker_closes_image_map(sample_config, sample_image_file,
+                                                     sample_processing_metadata):
+    """Test the worker returns a bytes copy and closes the memory map."""
+    maps = []
+    load_image_file = DocumentExtractor.load_image_file
+    
+    def tracking_load(self, file_path):
+        image_data = load_image_file(self, file_path)
+        maps.append(image_data)
+        return image_data
+    
+    with patch.object(DocumentExtractor, 'load_image_file', tracking_load):
+        image_data, _, _ = prepare_document_in_worker(
+            sample_config, sample_image_file, sample_processing_metadata
+        )
+    
+    assert image_data == sample_image_file.read_bytes()
+    assert maps and maps[0].closed
 
-@patch('services.extractor.DocumentExtractor.convert_pdf_to_image')
-@patch('services.extractor.DocumentExtractor.extract_text_from_pdf')
-def test_process_document_pdf(mock_extract_text, mock_convert_image, 
+
+@patch('services.extractor.DocumentExtractor._extract_pdf')
+def test_process_document_pdf(mock_extract_pdf, 
                              sample_config, mock_ai_client, sample_pdf_file, 
                              sample_processing_metadata):
     """Test processing PDF document."""
     extractor = DocumentExtractor(sample_config, mock_ai_client)
     
     # Setup mocks
-    mock_extract_text.return_value = ("Sample PDF text", 1)
-    mock_convert_image.return_value = b"fake_image_data"
+    mock_extract_pdf.return_value = ("Sample PDF text", 3, b"fake_image_data")
     
     # Mock AI response
     mock_ai_client.analyze_document.return_value = """{
@@ -194,6 +287,10 @@ def test_process_document_pdf(mock_extract_text, mock_convert_image,
     assert analysis.employee.name == "John Doe"
     assert analysis.overall_confidence == 0.85
     
+    # Metadata is frozen; the analysis carries an updated copy
+    assert analysis.processing_metadata.pages_processed == 3
+    assert sample_processing_metadata.pages_processed == 1
+    
     # Verify AI client was called
     mock_ai_client.analyze_document.assert_called_once()
 
@@ -241,4 +338,4 @@ def test_process_document_error_handling(sample_config, mock_ai_client,
     # Should return a minimal analysis with error info
     assert analysis.document_type == DocumentType.OTHER
     assert analysis.overall_confidence == 0.0
-    assert any("Processing error" in signal for signal in analysis.fraud_signals)
\ No newline at end of file
+    assert any("Processing error" in signal for signal in analysis.fraud_signals)
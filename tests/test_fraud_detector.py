@@ -2,10 +2,43 @@
 
 import pytest
 from datetime import date
+from unittest.mock import patch
 
 from services.fraud_detector import FraudDetector
 from services.models import DocumentType
 
+# Two payslips from the same template: Jaro-Winkler ~0.90, but only ~0.44
+# of their 5-character shingles are shared
+_SAME_TEMPLATE_PAYSLIPS = (
+    "Blue Harbour Logistics PLC\nPAYSLIP\nEmployee: Chen Brown\nNI Number: EE792317C\n"
+    "Pay Date: 2024-04-28\nTax Code: 1257L\nBasic Salary 5774.30\nIncome Tax 1154.86\n"
+    "National Insurance 461.94\nGross Pay 5774.30\nNet Pay 4157.50",
+    "Blue Harbour Logistics PLC\nPAYSLIP\nEmployee: Sarah Evans\nNI Number: GH451556B\n"
+    "Pay Date: 2024-10-28\nTax Code: 1257L\nBasic Salary 2174.41\nIncome Tax 434.88\n"
+    "National Insurance 173.95\nGross Pay 2174.41\nNet Pay 1565.58",
+)
+
+_TEMPLATE_EMPLOYEES = [
+    ("Chen Brown", "EE792317C", 5774.30, 4),
+    ("Sarah Evans", "GH451556B", 2174.41, 10),
+    ("Priya Patel", "JH908172D", 4185.50, 7),
+    ("Tom Wilson", "AB123456C", 1620.00, 1),
+]
+
+
+def _harbour_payslip(name, ni_number, gross, month):
+    return (f"Blue Harbour Logistics PLC\nPAYSLIP\nEmployee: {name}\nNI Number: {ni_number}\n"
+            f"Pay Date: 2024-{month:02d}-28\nTax Code: 1257L\nBasic Salary {gross:.2f}\n"
+            f"Income Tax {gross * 0.2:.2f}\nNational Insurance {gross * 0.08:.2f}\n"
+            f"Gross Pay {gross:.2f}\nNet Pay {gross * 0.72:.2f}")
+
+
+def _northwind_payslip(name, ni_number, gross, month):
+    return (f"NORTHWIND TRADING LTD - Statement of Earnings\nName: {name}   NINO: {ni_number}\n"
+            f"Period ending 31/{month:02d}/2024\nSalary ........ £{gross:,.2f}\n"
+            f"PAYE Tax ...... £{gross * 0.2:,.2f}\nEmployee NIC .. £{gross * 0.08:,.2f}\n"
+            f"Take home ..... £{gross * 0.72:,.2f}")
+
 
 def test_fraud_detector_init(sample_config):
     """Test FraudDetector initialization."""
@@ -136,13 +169,13 @@ def test_analyze_date_patterns_valid(sample_config, sample_document_analysis):
     assert len(fraud_signals) == 0
 
 
-def test_analyze_date_patterns_future_dates(sample_config, sample_document_analysis):
+def test_analyze_date_patterns_future_dates(sample_config, sample_document_analysis, today):
     """Test date pattern analysis with future dates."""
     detector = FraudDetector(sample_config)
     
     # Set future pay date
-    from datetime import date, timedelta
-    future_date = date.today() + timedelta(days=30)
+    from datetime import timedelta
+    future_date = today + timedelta(days=30)
     sample_document_analysis.pay_period.pay_date = future_date
     
     fraud_signals = detector.analyze_date_patterns(sample_document_analysis)
@@ -192,22 +225,26 @@ def test_check_ni_number_validity_fake_number(sample_config, sample_document_ana
     assert "fake_ni_number" in fraud_signals
 
 
-def test_detect_template_usage_no_reuse(sample_config):
+def test_detect_template_usage_no_reuse(sample_config, make_analysis_copy):
     """Test template usage detection with unique documents."""
     detector = FraudDetector(sample_config)
     
     # Create two documents with different text
+    texts = [
+        _harbour_payslip(*_TEMPLATE_EMPLOYEES[0]),
+        "Invoice 4471 for consultancy services rendered in March, payable in 30 days",
+    ]
     analyses = []
-    for i in range(2):
-        analysis = sample_document_analysis.model_copy()
-        analysis.raw_text = f"Unique payslip text content {i}"
+    for text in texts:
+        analysis = make_analysis_copy()
+        analysis.raw_text = text
         analyses.append(analysis)
     
     result = detector.detect_template_usage(analyses)
     assert result["template_reuse_detected"] == False
 
 
-def test_detect_template_usage_with_reuse(sample_config):
+def test_detect_template_usage_with_reuse(sample_config, make_analysis_copy):
     """Test template usage detection with similar documents."""
     detector = FraudDetector(sample_config)
     
@@ -215,7 +252,7 @@ def test_detect_template_usage_with_reuse(sample_config):
     similar_text = "This is a standard payslip template with minor variations"
     analyses = []
     for i in range(2):
-        analysis = sample_document_analysis.model_copy()
+        analysis = make_analysis_copy()
         analysis.raw_text = similar_text
         analyses.append(analysis)
     
@@ -223,6 +260,52 @@ def test_detect_template_usage_with_reuse(sample_config):
     assert result["template_reuse_detected"] == True
 
 
+@pytest.mark.parametrize("exact_scan_max", [32, 0])
+def test_detect_template_usage_near_duplicate_payslips(sample_config, make_analysis_copy,
+                                                       exact_scan_max):
+    """Test same-template payslips are flagged on both the exact and LSH paths."""
+    detector = FraudDetector(sample_config)
+    
+    analyses = []
+    for text in _SAME_TEMPLATE_PAYSLIPS:
+        analysis = make_analysis_copy()
+        analysis.raw_text = text
+        analyses.append(analysis)
+    
+    with patch('services.fraud_detector.TEMPLATE_EXACT_SCAN_MAX_DOCUMENTS', exact_scan_max):
+        result = detector.detect_template_usage(analyses)
+    
+    assert result["template_reuse_detected"] == True
+    assert [(p["doc1_index"], p["doc2_index"]) for p in result["suspicious_pairs"]] == [(0, 1)]
+
+
+def test_detect_template_usage_lsh_matches_exact_scan(sample_config, make_analysis_copy):
+    """Test the LSH path flags the same pairs as comparing every pair."""
+    detector = FraudDetector(sample_config)
+    
+    texts = [
+        template(*employee)
+        for template in (_harbour_payslip, _northwind_payslip)
+        for employee in _TEMPLATE_EMPLOYEES
+    ]
+    texts.append("Invoice 4471 for consultancy services rendered in March, payable in 30 days")
+    texts.append("Bank statement: opening balance 1,204.33, closing balance 986.10")
+    analyses = []
+    for text in texts:
+        analysis = make_analysis_copy()
+        analysis.raw_text = text
+        analyses.append(analysis)
+    
+    with patch('services.fraud_detector.TEMPLATE_EXACT_SCAN_MAX_DOCUMENTS', len(analyses)):
+        exact = detector.detect_template_usage(analyses)
+    with patch('services.fraud_detector.TEMPLATE_EXACT_SCAN_MAX_DOCUMENTS', 0):
+        lsh = detector.detect_template_usage(analyses)
+    
+    # Every pair within each template, none across templates or with the others
+    assert len(exact["suspicious_pairs"]) == 12
+    assert lsh["suspicious_pairs"] == exact["suspicious_pairs"]
+
+
 def test_analyze_document(sample_config, sample_document_analysis):
     """Test comprehensive document fraud analysis."""
     detector = FraudDetector(sample_config)
@@ -257,14 +340,14 @@ def test_analyze_document_with_fraud_signals(sample_config, sample_document_anal
     assert analyzed.overall_confidence < original_confidence
 
 
-def test_analyze_batch(sample_config):
+def test_analyze_batch(sample_config, make_analysis_copy):
     """Test batch fraud analysis."""
     detector = FraudDetector(sample_config)
     
     # Create batch of documents
     analyses = []
     for i in range(3):
-        analysis = sample_document_analysis.model_copy()
+        analysis = make_analysis_copy()
         analysis.raw_text = f"Document {i} with unique content"
         analyses.append(analysis)
     
@@ -273,4 +356,24 @@ def test_analyze_batch(sample_config):
     assert len(analyzed_batch) == 3
     # Each document should have been analyzed
     for analysis in analyzed_batch:
-        assert hasattr(analysis, 'fraud_signals')
\ No newline at end of file
+        assert hasattr(analysis, 'fraud_signals')
+
+
+def test_analyze_batch_parallel_matches_serial(sample_config, make_analysis_copy):
+    """Test process-pool fraud analysis gives the same results, in order."""
+    def make_batch():
+        analyses = []
+        for i in range(4):
+            analysis = make_analysis_copy()
+            analysis.raw_text = f"Document {i}   with  unique content {'#' * i * 2}"
+            analyses.append(analysis)
+        return analyses
+    
+    serial = FraudDetector(sample_config).analyze_batch(make_batch())
+    
+    sample_config.processing.workers = 2
+    with patch('services.fraud_detector.PARALLEL_MIN_DOCUMENTS', 2):
+        parallel = FraudDetector(sample_config).analyze_batch(make_batch())
+    
+    assert [sorted(a.fraud_signals) for a in parallel] == [sorted(a.fraud_signals) for a in serial]
+    assert [a.overall_confidence for a in parallel] == [a.overall_confidence for a in serial]
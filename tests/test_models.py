@@ -0,0 +1,25 @@
+"""Tests for data model helpers."""
+
+from datetime import datetime
+
+from services.models import BATCH_RESULT_ADAPTER, BatchResult, load_batch_result
+
+
+def test_load_batch_result_round_trip(sample_document_analysis, temp_dir):
+    """Test a saved batch summary reloads to an equal BatchResult."""
+    batch_result = BatchResult(
+        documents=[sample_document_analysis],
+        summary={"document_types": {"payslip": 1}},
+        processing_timestamp=datetime(2024, 2, 5, 10, 0),
+        total_files_processed=1,
+        successful_extractions=1,
+        failed_extractions=0
+    )
+    summary_path = temp_dir / "batch_summary.json"
+    summary_path.write_bytes(BATCH_RESULT_ADAPTER.dump_json(batch_result, indent=2))
+
+    loaded = load_batch_result(summary_path)
+
+    assert loaded.documents[0].employee.name == sample_document_analysis.employee.name
+    assert loaded.documents[0].pay_period.pay_date == sample_document_analysis.pay_period.pay_date
+    assert loaded.processing_timestamp == batch_result.processing_timestamp
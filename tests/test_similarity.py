@@ -0,0 +1,29 @@
+"""Tests for MinHash similarity helpers."""
+
+from services.similarity import NUM_PERM, lsh_candidate_pairs, minhash_signature, shingles
+
+
+def test_shingles_short_text():
+    """Test text shorter than a shingle is kept whole."""
+    assert shingles("abc") == {"abc"}
+    assert shingles("abcdef") == {"abcde", "bcdef"}
+
+
+def test_minhash_signature_is_deterministic():
+    """Test identical text always yields the same signature."""
+    first = minhash_signature("Standard payslip template")
+    second = minhash_signature("Standard payslip template")
+
+    assert len(first) == NUM_PERM
+    assert (first == second).all()
+
+
+def test_lsh_candidate_pairs_groups_near_duplicates():
+    """Test near-duplicate texts become candidates and unrelated text does not."""
+    signatures = [
+        (0, minhash_signature("This is a standard payslip template with minor variations")),
+        (1, minhash_signature("Completely different content about something else entirely")),
+        (2, minhash_signature("This is a standard payslip template with minor variation")),
+    ]
+
+    assert lsh_candidate_pairs(signatures) == [(0, 2)]
@@ -2,6 +2,7 @@
 
 import pytest
 from datetime import date, datetime
+from unittest.mock import patch
 from dateutil.relativedelta import relativedelta
 
 from services.verifier import DocumentVerifier
@@ -14,23 +15,23 @@ def test_verifier_init(sample_config):
     assert verifier.config == sample_config
 
 
-def test_check_document_recency_recent(sample_config, sample_document_analysis):
+def test_check_document_recency_recent(sample_config, sample_document_analysis, today):
     """Test recency check with recent document."""
     verifier = DocumentVerifier(sample_config)
     
     # Set pay date to last month (should pass)
-    sample_document_analysis.pay_period.pay_date = date.today() - relativedelta(months=1)
+    sample_document_analysis.pay_period.pay_date = today - relativedelta(months=1)
     
     result = verifier.check_document_recency(sample_document_analysis)
     assert result == True
 
 
-def test_check_document_recency_old(sample_config, sample_document_analysis):
+def test_check_document_recency_old(sample_config, sample_document_analysis, today):
     """Test recency check with old document."""
     verifier = DocumentVerifier(sample_config)
     
     # Set pay date to 12 months ago (should fail with 6 month limit)
-    sample_document_analysis.pay_period.pay_date = date.today() - relativedelta(months=12)
+    sample_document_analysis.pay_period.pay_date = today - relativedelta(months=12)
     
     result = verifier.check_document_recency(sample_document_analysis)
     assert result == False
@@ -46,6 +47,16 @@ def test_check_document_recency_no_date(sample_config, sample_document_analysis)
     assert result == False
 
 
+def test_check_document_recency_explicit_cutoff(sample_config, sample_document_analysis):
+    """Test recency check against a caller-supplied cutoff."""
+    verifier = DocumentVerifier(sample_config)
+    
+    sample_document_analysis.pay_period.pay_date = date(2024, 3, 1)
+    
+    assert verifier.check_document_recency(sample_document_analysis, date(2024, 3, 1)) == True
+    assert verifier.check_document_recency(sample_document_analysis, date(2024, 3, 2)) == False
+
+
 def test_check_total_consistency_valid(sample_config, sample_document_analysis):
     """Test total consistency check with matching totals."""
     verifier = DocumentVerifier(sample_config)
@@ -97,75 +108,64 @@ def test_check_qualified_signature(sample_config, sample_document_analysis):
     assert result == True
 
 
-def test_consecutive_periods_valid(sample_config):
+def test_consecutive_periods_valid(sample_config, monthly_payslip):
     """Test consecutive periods check with valid sequence."""
     verifier = DocumentVerifier(sample_config)
     sample_config.verification.min_consecutive_periods = 3
     
     # Create 3 consecutive monthly payslips
-    analyses = []
-    for i in range(3):
-        analysis = sample_document_analysis.model_copy()
-        analysis.employee.name = "John Smith"
-        analysis.pay_period.pay_date = date(2024, i + 1, 28)  # Jan, Feb, Mar
-        analysis.pay_period.frequency = PayFrequency.MONTHLY
-        analyses.append(analysis)
+    analyses = [monthly_payslip(date(2024, month, 28)) for month in (1, 2, 3)]
     
     results = verifier.check_consecutive_periods(analyses)
     assert results["John Smith"] == True
 
 
-def test_consecutive_periods_invalid_gaps(sample_config):
+def test_consecutive_periods_invalid_gaps(sample_config, monthly_payslip):
     """Test consecutive periods check with gaps."""
     verifier = DocumentVerifier(sample_config)
     sample_config.verification.min_consecutive_periods = 3
     
     # Create payslips with gaps
-    analyses = []
-    dates = [date(2024, 1, 28), date(2024, 3, 28), date(2024, 5, 28)]  # Skip Feb, Apr
-    
-    for i, pay_date in enumerate(dates):
-        analysis = sample_document_analysis.model_copy()
-        analysis.employee.name = "John Smith"
-        analysis.pay_period.pay_date = pay_date
-        analysis.pay_period.frequency = PayFrequency.MONTHLY
-        analyses.append(analysis)
+    analyses = [monthly_payslip(date(2024, month, 28)) for month in (1, 3, 5)]  # Skip Feb, Apr
     
     results = verifier.check_consecutive_periods(analyses)
     assert results["John Smith"] == False
 
 
-def test_consecutive_periods_insufficient_count(sample_config):
+def test_consecutive_periods_insufficient_count(sample_config, monthly_payslip):
     """Test consecutive periods check with insufficient documents."""
     verifier = DocumentVerifier(sample_config)
     sample_config.verification.min_consecutive_periods = 3
     
     # Create only 2 payslips
-    analyses = []
-    for i in range(2):
-        analysis = sample_document_analysis.model_copy()
-        analysis.employee.name = "John Smith"
-        analysis.pay_period.pay_date = date(2024, i + 1, 28)
-        analysis.pay_period.frequency = PayFrequency.MONTHLY
-        analyses.append(analysis)
+    analyses = [monthly_payslip(date(2024, month, 28)) for month in (1, 2)]
     
     results = verifier.check_consecutive_periods(analyses)
     assert results["John Smith"] == False
 
 
-def test_validate_income_consistency_consistent(sample_config):
+def test_consecutive_periods_monthly_by_calendar_month(sample_config, monthly_payslip):
+    """Test monthly payslips are consecutive by calendar month, not day count."""
+    verifier = DocumentVerifier(sample_config)
+    sample_config.verification.min_consecutive_periods = 3
+    
+    # Paid on the last working day: gaps of 34 and 28 days, one per month
+    dates = [date(2024, 1, 26), date(2024, 2, 29), date(2024, 3, 28)]
+    analyses = [monthly_payslip(pay_date) for pay_date in dates]
+    assert verifier.check_consecutive_periods(analyses)["John Smith"] == True
+    
+    # Roughly 28 days apart, but two in January and none in March
+    dates = [date(2024, 1, 2), date(2024, 1, 30), date(2024, 2, 27)]
+    analyses = [monthly_payslip(pay_date) for pay_date in dates]
+    assert verifier.check_consecutive_periods(analyses)["John Smith"] == False
+
+
+def test_validate_income_consistency_consistent(sample_config, monthly_payslip):
     """Test income consistency validation with consistent amounts."""
     verifier = DocumentVerifier(sample_config)
     
     # Create payslips with consistent income
-    analyses = []
-    for i in range(3):
-        analysis = sample_document_analysis.model_copy()
-        analysis.employee.name = "John Smith"
-        analysis.total_gross_pay = 3000.00  # Consistent amount
-        analysis.pay_period.pay_date = date(2024, i + 1, 28)
-        analysis.pay_period.frequency = PayFrequency.MONTHLY
-        analyses.append(analysis)
+    analyses = [monthly_payslip(date(2024, i + 1, 28), 3000.00) for i in range(3)]
     
     results = verifier.validate_income_consistency(analyses)
     
@@ -173,21 +173,15 @@ def test_validate_income_consistency_consistent(sample_config):
     assert len(results["John Smith"]["outliers"]) == 0
 
 
-def test_validate_income_consistency_outliers(sample_config):
+def test_validate_income_consistency_outliers(sample_config, monthly_payslip):
     """Test income consistency validation with outliers."""
     verifier = DocumentVerifier(sample_config)
     
     # Create payslips with one outlier
-    analyses = []
     amounts = [3000.00, 3000.00, 5000.00]  # Third one is an outlier
-    
-    for i, amount in enumerate(amounts):
-        analysis = sample_document_analysis.model_copy()
-        analysis.employee.name = "John Smith"
-        analysis.total_gross_pay = amount
-        analysis.pay_period.pay_date = date(2024, i + 1, 28)
-        analysis.pay_period.frequency = PayFrequency.MONTHLY
-        analyses.append(analysis)
+    analyses = [
+        monthly_payslip(date(2024, i + 1, 28), amount) for i, amount in enumerate(amounts)
+    ]
     
     results = verifier.validate_income_consistency(analyses)
     
@@ -196,12 +190,29 @@ def test_validate_income_consistency_outliers(sample_config):
     assert results["John Smith"]["outliers"][0]["amount"] == 5000.00
 
 
-def test_verify_document(sample_config, sample_document_analysis):
+def test_validate_income_consistency_threshold(sample_config, monthly_payslip):
+    """Test the outlier threshold comes from the verification config."""
+    sample_config.verification.income_deviation_threshold = 0.5
+    verifier = DocumentVerifier(sample_config)
+    
+    # 5000 is ~36% above the mean, inside a 50% threshold
+    amounts = [3000.00, 3000.00, 5000.00]
+    analyses = [
+        monthly_payslip(date(2024, i + 1, 28), amount) for i, amount in enumerate(amounts)
+    ]
+    
+    results = verifier.validate_income_consistency(analyses)
+    
+    assert results["John Smith"]["consistent"] == True
+    assert results["John Smith"]["outliers"] == []
+
+
+def test_verify_document(sample_config, sample_document_analysis, today):
     """Test single document verification."""
     verifier = DocumentVerifier(sample_config)
     
     # Set up for successful verification
-    sample_document_analysis.pay_period.pay_date = date.today() - relativedelta(months=1)
+    sample_document_analysis.pay_period.pay_date = today - relativedelta(months=1)
     
     verified = verifier.verify_document(sample_document_analysis)
     
@@ -211,12 +222,12 @@ def test_verify_document(sample_config, sample_document_analysis):
     assert verified.overall_confidence >= 0.7
 
 
-def test_verify_document_with_failures(sample_config, sample_document_analysis):
+def test_verify_document_with_failures(sample_config, sample_document_analysis, today):
     """Test single document verification with failures."""
     verifier = DocumentVerifier(sample_config)
     
     # Set up for failed verification
-    sample_document_analysis.pay_period.pay_date = date.today() - relativedelta(months=12)  # Too old
+    sample_document_analysis.pay_period.pay_date = today - relativedelta(months=12)  # Too old
     sample_document_analysis.total_gross_pay = 4000.00  # Doesn't match income sum
     
     verified = verifier.verify_document(sample_document_analysis)
@@ -229,19 +240,63 @@ def test_verify_document_with_failures(sample_config, sample_document_analysis):
     assert verified.overall_confidence < 0.7
 
 
-def test_verify_batch(sample_config):
+def test_verify_document_early_exit(sample_config, sample_document_analysis, today):
+    """Test early exit skips the checks after the first failure."""
+    sample_config.verification.early_exit_on_fraud = True
+    sample_config.verification.require_qualified_accountant_signature = True
+    verifier = DocumentVerifier(sample_config)
+    
+    sample_document_analysis.pay_period.pay_date = today - relativedelta(months=12)  # Too old
+    sample_document_analysis.total_gross_pay = 4000.00  # Doesn't match income sum
+    
+    with patch.object(verifier, 'check_total_consistency') as total_check, \
+            patch.object(verifier, 'check_qualified_signature') as signature_check:
+        verified = verifier.verify_document(sample_document_analysis)
+    
+    total_check.assert_not_called()
+    signature_check.assert_not_called()
+    assert verified.verifications.recency_pass == False
+    assert verified.verifications.total_consistency_pass is None
+    assert verified.verifications.qualified_signature_pass is None
+    assert verified.fraud_signals == ["document_too_old"]
+
+
+def test_verify_document_reuses_checks_for_same_content(sample_config, make_analysis_copy):
+    """Test repeated content skips re-running the per-document checks."""
+    verifier = DocumentVerifier(sample_config)
+    first = make_analysis_copy()
+    second = make_analysis_copy()
+    
+    with patch.object(verifier, 'check_qualified_signature', wraps=verifier.check_qualified_signature) as check:
+        verifier.verify_document(first)
+        verifier.verify_document(second)
+    
+    assert check.call_count == 1
+    assert first.verifications == second.verifications
+
+
+def test_verify_document_cache_follows_signature_setting(sample_config, make_analysis_copy):
+    """Test toggling the signature requirement isn't masked by cached results."""
+    sample_config.verification.require_qualified_accountant_signature = False
+    verifier = DocumentVerifier(sample_config)
+    first, second = make_analysis_copy(), make_analysis_copy()
+    first.raw_text = second.raw_text = "Regular payslip text"
+    
+    first = verifier.verify_document(first)
+    sample_config.verification.require_qualified_accountant_signature = True
+    second = verifier.verify_document(second)
+    
+    assert first.verifications.qualified_signature_pass == True
+    assert second.verifications.qualified_signature_pass == False
+
+
+def test_verify_batch(sample_config, monthly_payslip):
     """Test batch verification."""
     verifier = DocumentVerifier(sample_config)
     sample_config.verification.min_consecutive_periods = 2
     
     # Create 2 consecutive valid payslips
-    analyses = []
-    for i in range(2):
-        analysis = sample_document_analysis.model_copy()
-        analysis.employee.name = "John Smith"
-        analysis.pay_period.pay_date = date(2024, i + 1, 28)
-        analysis.pay_period.frequency = PayFrequency.MONTHLY
-        analyses.append(analysis)
+    analyses = [monthly_payslip(date(2024, month, 28)) for month in (1, 2)]
     
     verified_analyses = verifier.verify_batch(analyses)
     
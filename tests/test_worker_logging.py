@@ -0,0 +1,30 @@
+"""Tests for worker process log forwarding."""
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from services import worker_logging
+from services.worker_logging import create_log_queue, pool_initializer
+
+
+def _log_from_worker(message):
+    logging.getLogger("services.test_worker").warning(message)
+
+
+def test_pool_initializer_empty_without_queue(monkeypatch):
+    """Test pools are left alone when queue-based logging isn't installed."""
+    monkeypatch.setattr(worker_logging, "_log_queue", None)
+    assert pool_initializer() == {}
+
+
+def test_worker_records_reach_parent_queue(monkeypatch):
+    """Test records logged in a pool worker arrive on the parent's queue."""
+    monkeypatch.setattr(worker_logging, "_log_queue", None)
+    log_queue = create_log_queue()
+    
+    with ProcessPoolExecutor(max_workers=1, **pool_initializer()) as executor:
+        executor.submit(_log_from_worker, "from worker").result()
+    
+    record = log_queue.get(timeout=5)
+    assert record.getMessage() == "from worker"
+    assert record.name == "services.test_worker"